@@ -2,28 +2,69 @@
 FastAPI server for Telegram Mini App API endpoints
 """
 import math
+import base64
+import binascii
 import logging
-from fastapi import FastAPI, Query, HTTPException, Request
+from fastapi import Depends, FastAPI, Query, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
-from sqlalchemy import select, func
-from typing import List, Optional
-from pydantic import BaseModel
+from fastapi.responses import HTMLResponse, Response
+from typing import Any, Dict, List, Optional
 from contextlib import asynccontextmanager
 
-from mdm_bot.core import AsyncSessionFactory, Product, settings
-from mdm_bot.core.search import get_meili_client
+from mdm_bot.core import AsyncSessionFactory, create_tables, settings, get_pool_stats
+from mdm_bot.core.search import (
+    SEARCH_FACETS,
+    close_meili_client,
+    get_meili_client,
+    normalize_query,
+    search_cache,
+)
+from mdm_bot.core.stock import WAREHOUSES
+from .catalog import (
+    catalog_snapshot,
+    count_products,
+    load_products_after,
+    load_products_by_ids,
+    load_products_page,
+    read_product,
+    read_products,
+    read_products_page,
+)
+from .filters import ProductFilters, product_filters
+from .assets import PrecompressedStaticFiles, build_assets
+from .http_cache import current_search_version, etag_matches, not_modified, uncacheable
+from .images import (
+    THUMBNAIL_MEDIA_TYPE, THUMBNAIL_SIZES, ImageUnavailable, image_revision, thumbnail_name, thumbnail_service
+)
+from .responses import ORJSONResponse, cached_json, encoded_cache, json_response
+from .pages import (
+    CATALOG_PAGE_SIZE,
+    fragment_cache,
+    render_catalog_fragment,
+    render_product_fragment,
+    templates,
+)
+from .schemas import (
+    ProductResponse,
+    ProductsBatchRequest,
+    ProductsBatchResponse,
+    ProductsListResponse,
+    SearchResponse,
+    WarehouseResponse,
+)
 
 logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Initialize MeiliSearch on startup"""
+    """Apply migrations and initialize MeiliSearch on startup"""
     logger.info("Starting FastAPI application...")
 
+    # Catalog reads and the search sync need the current schema; the advisory
+    # lock lets the bot and the API start in any order
+    await create_tables()
+
     try:
         # Initialize MeiliSearch client and sync products
         meili = await get_meili_client()
@@ -32,20 +73,31 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.warning(f"MeiliSearch initialization failed (will work without search): {e}")
 
+    if settings.CATALOG_CACHE_ENABLED:
+        try:
+            await catalog_snapshot.refresh()
+        except Exception as e:
+            logger.warning(f"Catalog snapshot warm-up failed (will load on first request): {e}")
+
+    try:
+        await thumbnail_service.start()
+    except Exception as e:
+        logger.warning(f"Thumbnail cache indexing failed (will fill from scratch): {e}")
+
     yield
 
     logger.info("Shutting down FastAPI application...")
+    await close_meili_client()
+    await thumbnail_service.close()
 
 
 app = FastAPI(
     title="MDM Bot API",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
-# Setup Jinja2 templates
-templates = Jinja2Templates(directory="templates")
-
 # CORS configuration with environment variable support
 allowed_origins = (
     settings.ALLOWED_ORIGINS.split(",")
@@ -63,86 +115,288 @@ app.add_middleware(
 )
 
 
-# Pydantic models for API
-class ProductResponse(BaseModel):
-    id: int
-    name: str
-    price: float
-    image: Optional[str] = None
-    vendor_code: Optional[str] = None
-    description: Optional[str] = None
+# Index document fields needed to build ProductResponse
+SEARCH_RESPONSE_FIELDS = set(ProductResponse.model_fields)
+
 
-    class Config:
-        from_attributes = True
+# Product IDs are INT4 in the database, larger values can't exist
+MAX_PRODUCT_ID = 2 ** 31 - 1
 
 
-class ProductsListResponse(BaseModel):
-    items: List[ProductResponse]
-    total: int
-    page: int
-    limit: int
-    total_pages: int
+def encode_cursor(product_id: int) -> str:
+    """Encode last seen product ID into an opaque pagination cursor"""
+    return base64.urlsafe_b64encode(str(product_id).encode()).decode().rstrip("=")
 
 
-class SearchResponse(BaseModel):
-    items: List[ProductResponse]
-    total: int
-    query: str
+async def hits_to_products(hits: List[Dict[str, Any]]) -> List[ProductResponse]:
+    """Build products from search hits, keeping the order from MeiliSearch"""
+    # Documents indexed before a field was added are completed from the database
+    stale_ids = [hit['id'] for hit in hits if not SEARCH_RESPONSE_FIELDS.issubset(hit)]
+    products_dict = {}
+    if stale_ids:
+        async with AsyncSessionFactory() as session:
+            products_dict = await load_products_by_ids(session, stale_ids)
+
+    items = []
+    for hit in hits:
+        if hit['id'] in products_dict:
+            items.append(products_dict[hit['id']])
+        elif SEARCH_RESPONSE_FIELDS.issubset(hit):
+            items.append(ProductResponse.model_validate(hit))
+    return items
+
+
+def facets_from_results(results: Dict[str, Any]) -> Dict[str, Any]:
+    """Facet counts and numeric ranges of a MeiliSearch response"""
+    distribution = dict(results.get('facetDistribution') or {})
+    # Every distinct price would be a bucket, price is described by its range instead
+    distribution.pop('price', None)
+    return {
+        'facets': distribution,
+        'facet_stats': results.get('facetStats') or {},
+    }
+
+
+async def search_index(
+    query: str,
+    filters: ProductFilters,
+    limit: int,
+    page: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Run filtered search with facets (placeholder search for an empty query)
+
+    Without `page` up to `limit` best hits are returned with an estimated
+    total; with `page` the total is exact.
+
+    Returns:
+        Dict with items, total, facets and facet_stats
+    """
+    meili = await get_meili_client()
+    attributes = sorted(SEARCH_RESPONSE_FIELDS) if settings.SEARCH_FROM_INDEX else ['id']
+    # Plain listing keeps the catalog order
+    sort = filters.meili_sort() or (['id:asc'] if not query else [])
+    results = await meili.search(
+        query,
+        attributes=attributes,
+        filter=filters.meili_filter(),
+        sort=sort,
+        facets=SEARCH_FACETS,
+        limit=limit,
+        page=page,
+        hits_per_page=limit if page is not None else None,
+    )
+    total = results['totalHits'] if page is not None else results.get('estimatedTotalHits', 0)
+    return {
+        'items': await hits_to_products(results['hits']),
+        'total': total,
+        **facets_from_results(results),
+    }
+
+
+def decode_cursor(cursor: str) -> int:
+    """Decode pagination cursor back into product ID"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        product_id = int(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+    # Forged values would overflow the INT4 query parameter
+    if not 0 <= product_id <= MAX_PRODUCT_ID:
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+    return product_id
 
 
 @app.get("/api/products", response_model=ProductsListResponse)
 async def get_products(
+    request: Request,
+    response: Response,
     page: int = Query(1, ge=1, description="Номер страницы"),
-    limit: int = Query(20, ge=1, le=100, description="Количество товаров на странице")
+    limit: int = Query(20, ge=1, le=100, description="Количество товаров на странице"),
+    after: Optional[str] = Query(None, description="Курсор следующей страницы (next_cursor)"),
+    facets: bool = Query(False, description="Вернуть счётчики фильтров для всего каталога"),
+    filters: ProductFilters = Depends(product_filters)
 ):
-    """Get paginated product list"""
+    """
+    Get paginated product list
+
+    Without `after` the classic page/limit contract is used (with total count).
+    With `after` the list is continued by primary key seek: no count and no
+    OFFSET, so every page costs the same regardless of its depth.
+
+    Filtered or sorted pages (and `facets=true`) are answered by the search
+    index together with facet counts; when the index is unavailable the same
+    filters run in the database without facets. Cursor pagination supports
+    filters but not sorting.
+
+    Responses carry the catalog version ETag (plus the search sync marker when
+    the index answers); a matching If-None-Match gets 304. The database
+    fallback of an index-backed listing is sent with no-store.
+    """
     try:
-        async with AsyncSessionFactory() as session:
-            # Count total products
-            count_query = select(func.count(Product.id))
-            total_result = await session.execute(count_query)
-            total = total_result.scalar()
-
-            # Calculate pagination
-            total_pages = math.ceil(total / limit)
-            offset = (page - 1) * limit
-
-            # Get products for current page
-            query = (
-                select(Product)
-                .order_by(Product.id)
-                .offset(offset)
-                .limit(limit)
-            )
-            result = await session.execute(query)
-            products = result.scalars().all()
-
-            # Build response
-            return ProductsListResponse(
-                items=[ProductResponse.model_validate(p) for p in products],
-                total=total,
-                page=page,
+        use_index = after is None and (facets or not filters.is_empty)
+        cached_response = (await not_modified(request, response, search=use_index)
+                           or cached_json(request, response))
+        if cached_response is not None:
+            return cached_response
+
+        conditions = filters.sql_conditions()
+        use_snapshot = settings.CATALOG_CACHE_ENABLED and not conditions
+
+        if after is not None:
+            if filters.sort is not None:
+                raise HTTPException(status_code=400, detail="Курсор нельзя сочетать с сортировкой")
+            after_id = decode_cursor(after)
+
+            # Fetch one extra row to know whether there is a next page
+            if use_snapshot:
+                products = await catalog_snapshot.get_after(after_id, limit + 1)
+            else:
+                async with AsyncSessionFactory() as session:
+                    products = await load_products_after(session, after_id, limit + 1, conditions)
+
+            has_more = len(products) > limit
+            products = products[:limit]
+
+            return json_response(request, response, ProductsListResponse(
+                items=products,
                 limit=limit,
-                total_pages=total_pages
-            )
+                next_cursor=encode_cursor(products[-1].id) if has_more else None
+            ))
+
+        if use_index:
+            cache_key = ("products", page, limit, filters, await current_search_version())
+            result = search_cache.get(cache_key)
+            if result is None:
+                try:
+                    result = await search_index("", filters, limit, page=page)
+                    if result['items']:
+                        search_cache.set(cache_key, result)
+                except Exception as e:
+                    logger.warning(f"Filtered listing from search index failed, using database: {e}")
+
+            if result is not None:
+                total_pages = math.ceil(result['total'] / limit)
+                return json_response(request, response, ProductsListResponse(
+                    **result,
+                    page=page,
+                    limit=limit,
+                    total_pages=total_pages,
+                    # Keyset cursor follows ID order only
+                    next_cursor=(encode_cursor(result['items'][-1].id)
+                                 if filters.sort is None and page < total_pages and result['items'] else None)
+                ))
+
+        offset = (page - 1) * limit
+        if filters.is_empty:
+            products, total = await read_products_page(offset, limit)
+        else:
+            async with AsyncSessionFactory() as session:
+                total = await count_products(session, conditions)
+                products = await load_products_page(session, offset, limit, conditions, filters.sql_order())
+
+        total_pages = math.ceil(total / limit)
+
+        if use_index:
+            # Database fallback is not kept anywhere, facets come back with the index
+            uncacheable(response)
+
+        return json_response(request, response, ProductsListResponse(
+            items=products,
+            total=total,
+            page=page,
+            limit=limit,
+            total_pages=total_pages,
+            next_cursor=(encode_cursor(products[-1].id)
+                         if filters.sort is None and page < total_pages and products else None)
+        ), cache=not use_index)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка сервера: {str(e)}")
+
+
+@app.get("/api/warehouses", response_model=List[WarehouseResponse])
+async def get_warehouses():
+    """List warehouses usable in the `warehouse` product filter"""
+    return [WarehouseResponse(code=warehouse.code, name=warehouse.name) for warehouse in WAREHOUSES]
+
+
+def parse_product_ids(ids: str) -> List[int]:
+    """Parse comma-separated product IDs"""
+    try:
+        return [int(part) for part in ids.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректный список ID")
+
+
+async def products_batch(product_ids: List[int]) -> ProductsBatchResponse:
+    """Resolve product IDs in one lookup, keeping request order (duplicates are dropped)"""
+    if len(product_ids) > settings.PRODUCTS_BATCH_MAX_IDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Не больше {settings.PRODUCTS_BATCH_MAX_IDS} ID за запрос"
+        )
+
+    requested = list(dict.fromkeys(product_ids))
+    products = await read_products([pid for pid in requested if 0 < pid <= MAX_PRODUCT_ID])
+    return ProductsBatchResponse(
+        items=[products[pid] for pid in requested if pid in products],
+        missing=[pid for pid in requested if pid not in products]
+    )
+
+
+@app.get("/api/products/batch", response_model=ProductsBatchResponse)
+async def get_products_batch(
+    request: Request,
+    response: Response,
+    ids: str = Query(..., description="ID товаров через запятую")
+):
+    """
+    Get several products by ID (cart, favorites and order screens)
+
+    Products are returned in request order; IDs not in the catalog are
+    listed in `missing`. Long lists can be sent with POST instead.
+    """
+    try:
+        cached_response = await not_modified(request, response) or cached_json(request, response)
+        if cached_response is not None:
+            return cached_response
+
+        return json_response(request, response, await products_batch(parse_product_ids(ids)))
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка сервера: {str(e)}")
+
 
+@app.post("/api/products/batch", response_model=ProductsBatchResponse)
+async def post_products_batch(body: ProductsBatchRequest):
+    """Get several products by ID, IDs in the request body"""
+    try:
+        return ORJSONResponse(await products_batch(body.ids))
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка сервера: {str(e)}")
 
 
 @app.get("/api/products/{product_id}", response_model=ProductResponse)
-async def get_product(product_id: int):
+async def get_product(product_id: int, request: Request, response: Response):
     """Get specific product information"""
     try:
-        async with AsyncSessionFactory() as session:
-            query = select(Product).where(Product.id == product_id)
-            result = await session.execute(query)
-            product = result.scalar_one_or_none()
+        cached_response = await not_modified(request, response) or cached_json(request, response)
+        if cached_response is not None:
+            return cached_response
 
-            if not product:
-                raise HTTPException(status_code=404, detail="Товар не найден")
+        product = await read_product(product_id)
+        if not product:
+            raise HTTPException(status_code=404, detail="Товар не найден")
 
-            return ProductResponse.model_validate(product)
+        return json_response(request, response, product)
 
     except HTTPException:
         raise
@@ -152,38 +406,95 @@ async def get_product(product_id: int):
 
 @app.get("/api/search", response_model=SearchResponse)
 async def search_products(
+    request: Request,
+    response: Response,
     q: str = Query(..., min_length=1, description="Поисковый запрос"),
-    limit: int = Query(20, ge=1, le=100, description="Максимум результатов")
+    limit: int = Query(20, ge=1, le=100, description="Максимум результатов"),
+    filters: ProductFilters = Depends(product_filters)
 ):
-    """Search products using MeiliSearch"""
+    """
+    Search products using MeiliSearch
+
+    Filters and sort narrow the result set in the index; facet counts
+    describe all matches, not just the returned ones.
+    """
     try:
-        # Get MeiliSearch client
-        meili = await get_meili_client()
+        cached_response = (await not_modified(request, response, search=True)
+                           or cached_json(request, response))
+        if cached_response is not None:
+            return cached_response
+
+        # Popular queries are answered from the in-process cache
+        normalized = normalize_query(q)
+        cache_key = (normalized, limit, filters, await current_search_version())
+        result = search_cache.get(cache_key)
+        if result is not None:
+            return json_response(request, response, SearchResponse(**result, query=q))
+
+        try:
+            result = await search_index(normalized, filters, limit)
+        except Exception as e:
+            logger.error(f"Error searching products: {e}")
+            # Don't let clients keep the empty answer of an unavailable index
+            uncacheable(response)
+            return json_response(request, response, SearchResponse(items=[], total=0, query=q), cache=False)
+
+        # Empty results are not cached: they may come from an index being rebuilt
+        if result['items']:
+            search_cache.set(cache_key, result)
+
+        return json_response(request, response, SearchResponse(**result, query=q), cache=bool(result['items']))
 
-        # Search for product IDs
-        product_ids = meili.search_products(q, limit=limit)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка поиска: {str(e)}")
 
-        if not product_ids:
-            return SearchResponse(items=[], total=0, query=q)
 
-        # Fetch products from database
-        async with AsyncSessionFactory() as session:
-            query = select(Product).where(Product.id.in_(product_ids))
-            result = await session.execute(query)
-            products = result.scalars().all()
+@app.get("/api/images/{product_id}/{size}")
+async def get_product_image(
+    product_id: int,
+    size: str,
+    request: Request,
+    v: Optional[str] = Query(None, description="Ревизия изображения (image_version товара)")
+):
+    """
+    Get product image thumbnail (size: tile or detail)
 
-            # Sort by the order from MeiliSearch
-            products_dict = {p.id: p for p in products}
-            sorted_products = [products_dict[pid] for pid in product_ids if pid in products_dict]
+    URLs carrying the current image_version are cached for long; other URLs
+    only briefly, so a replaced product image shows up without waiting.
+    """
+    try:
+        if size not in THUMBNAIL_SIZES:
+            raise HTTPException(status_code=404, detail="Размер изображения не найден")
+
+        product = await read_product(product_id)
+        if not product or not product.image:
+            raise HTTPException(status_code=404, detail="Изображение не найдено")
+
+        # Thumbnails of a URL never change while cached, the file name identifies the content
+        etag = f'"{thumbnail_name(product.image, size)[:32]}"'
+        max_age = (settings.IMAGE_CACHE_CONTROL_MAX_AGE if v == image_revision(product.image)
+                   else settings.HTTP_CACHE_MAX_AGE)
+        headers = {
+            "Cache-Control": f"public, max-age={max_age}",
+            "ETag": etag,
+        }
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+
+        try:
+            content = await thumbnail_service.get(product.image, size)
+        except ImageUnavailable as e:
+            logger.warning(f"Image of product {product_id} unavailable: {e}")
+            raise HTTPException(status_code=502, detail="Изображение недоступно")
 
-            return SearchResponse(
-                items=[ProductResponse.model_validate(p) for p in sorted_products],
-                total=len(sorted_products),
-                query=q
-            )
+        return Response(content=content, media_type=THUMBNAIL_MEDIA_TYPE, headers=headers)
 
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Ошибка поиска: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Ошибка сервера: {str(e)}")
 
 
 @app.get("/api/health")
@@ -192,43 +503,63 @@ async def health_check():
     return {"status": "ok", "service": "mdm-bot-api"}
 
 
+@app.get("/api/stats")
+async def stats():
+    """In-process cache and connection pool statistics (nginx keeps it internal)"""
+    return {
+        "search_cache": search_cache.stats(),
+        "catalog_snapshot": catalog_snapshot.stats(),
+        "fragment_cache": fragment_cache.stats(),
+        "encoded_cache": encoded_cache.stats(),
+        "thumbnails": thumbnail_service.stats(),
+        "db_pool": get_pool_stats(),
+    }
+
+
 # HTML routes with Jinja2 templates
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
     """Main page"""
-    return templates.TemplateResponse("index.html", {"request": request})
+    return templates.TemplateResponse(request, "index.html")
 
 
 @app.get("/products", response_class=HTMLResponse)
 async def products_page(request: Request):
-    """Product catalog page"""
-    return templates.TemplateResponse("products.html", {"request": request})
+    """Product catalog page with the first page of products rendered in"""
+    products_html, total_pages = await render_catalog_fragment()
+    return templates.TemplateResponse(
+        request,
+        "products.html",
+        {
+            "products_html": products_html,
+            "total_pages": total_pages,
+            "limit": CATALOG_PAGE_SIZE
+        }
+    )
 
 
 @app.get("/products/{product_id}", response_class=HTMLResponse)
 async def product_detail_page(request: Request, product_id: int):
-    """Product detail page"""
+    """Product detail page with the product rendered in (no API round trip)"""
+    product_html = await render_product_fragment(product_id)
     return templates.TemplateResponse(
+        request,
         "product_detail.html",
         {
-            "request": request,
             "product_id": product_id,
-            "product": None 
-        }
+            "product_html": product_html
+        },
+        status_code=200 if product_html is not None else 404
     )
     
 @app.get("/support", response_class=HTMLResponse)
 async def support_page(request: Request):
-    return templates.TemplateResponse(
-        "support.html",
-        {
-            "request": request
-        }
-    )
+    return templates.TemplateResponse(request, "support.html")
 
 
-# Mount static files
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Fingerprint and precompress static files, then serve the built copies
+build_assets("static", settings.STATIC_BUILD_DIR)
+app.mount("/static", PrecompressedStaticFiles(directory=settings.STATIC_BUILD_DIR), name="static")
 
 
 if __name__ == "__main__":
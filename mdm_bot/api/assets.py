@@ -0,0 +1,176 @@
+"""
+Fingerprinted, precompressed static assets
+
+At startup every file under the static directory is copied into the build
+directory twice: under its own name and under a content-hashed name
+(css/style.css -> css/style.1a2b3c4d5e6f.css). Text assets also get .gz and
+.br variants. Templates link assets through static_url(), which returns the
+hashed path; hashed paths never change content, so they are served with
+immutable caching. Outputs are written atomically and only when their
+content changed, so concurrent workers and restarts are cheap.
+"""
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import stat
+import tempfile
+from pathlib import Path
+from typing import Dict, Optional, Set
+import anyio
+import brotli
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+logger = logging.getLogger(__name__)
+
+STATIC_URL = "/static/"
+
+# Only text formats compress well, images are already compressed
+COMPRESSIBLE_SUFFIXES = {".css", ".js", ".mjs", ".svg", ".html", ".json", ".txt", ".xml", ".map"}
+
+# Precompressed variants in order of preference: (Content-Encoding, file suffix)
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Logical asset path -> fingerprinted path, filled by build_assets()
+manifest: Dict[str, str] = {}
+
+
+def fingerprinted_name(path: str, content: bytes) -> str:
+    """Insert content hash before the file extension"""
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    base, extension = os.path.splitext(path)
+    return f"{base}.{digest}{extension}"
+
+
+def _write_atomic(target: Path, content: bytes) -> bool:
+    """
+    Write file via a temporary file and rename
+
+    Returns:
+        False if the file already had this content
+    """
+    if target.exists() and target.read_bytes() == content:
+        return False
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=target.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            tmp.write(content)
+        os.replace(tmp_path, target)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return True
+
+
+# Precompressed variant suffix -> compressor
+COMPRESSORS = {
+    ".br": lambda content: brotli.compress(content, quality=11),
+    ".gz": lambda content: gzip.compress(content, compresslevel=9, mtime=0),
+}
+
+
+def _write_variants(target: Path, content: bytes):
+    """Write asset and its precompressed variants (when they are smaller)"""
+    changed = _write_atomic(target, content)
+    if target.suffix.lower() not in COMPRESSIBLE_SUFFIXES:
+        return
+
+    for suffix, compress in COMPRESSORS.items():
+        variant = target.with_name(target.name + suffix)
+        if not changed and variant.exists():
+            continue
+        compressed = compress(content)
+        if len(compressed) < len(content):
+            _write_atomic(variant, compressed)
+        elif variant.exists():
+            variant.unlink(missing_ok=True)
+
+
+def build_assets(source_dir: str, build_dir: str) -> Dict[str, str]:
+    """
+    Build fingerprinted and precompressed copies of static assets
+
+    Returns:
+        Manifest of logical path -> fingerprinted path (also kept in `manifest`)
+    """
+    source, build = Path(source_dir), Path(build_dir)
+    built = {}
+    for file in sorted(source.rglob("*")):
+        # is_file() follows symlinks, dangling ones are skipped
+        if not file.is_file():
+            continue
+
+        logical = file.relative_to(source).as_posix()
+        content = file.read_bytes()
+        hashed = fingerprinted_name(logical, content)
+
+        _write_variants(build / logical, content)
+        _write_variants(build / hashed, content)
+        built[logical] = hashed
+
+    manifest.clear()
+    manifest.update(built)
+    logger.info(f"Static assets built: {len(built)} files in {build_dir}")
+    return built
+
+
+def static_url(path: str) -> str:
+    """URL of a static asset, fingerprinted when the asset is known"""
+    return STATIC_URL + manifest.get(path, path)
+
+
+def _accepted_encodings(scope: Scope) -> Set[str]:
+    accepted = set()
+    for item in Headers(scope=scope).get("accept-encoding", "").split(","):
+        name, _, params = item.strip().partition(";")
+        if params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    Static files with negotiated .br/.gz variants and immutable caching
+    of fingerprinted paths
+    """
+
+    async def _precompressed_response(self, path: str, scope: Scope) -> Optional[Response]:
+        accepted = _accepted_encodings(scope)
+        for encoding, suffix in ENCODINGS:
+            if encoding not in accepted:
+                continue
+            full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+            if stat_result is None or not stat.S_ISREG(stat_result.st_mode):
+                continue
+
+            media_type, _ = mimetypes.guess_type(path)
+            response = FileResponse(
+                full_path,
+                stat_result=stat_result,
+                media_type=media_type or "application/octet-stream",
+                headers={"Content-Encoding": encoding},
+            )
+            if self.is_not_modified(response.headers, Headers(scope=scope)):
+                return NotModifiedResponse(response.headers)
+            return response
+        return None
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        relative = path.replace(os.sep, "/")
+        response = await self._precompressed_response(path, scope)
+        if response is None:
+            response = await super().get_response(path, scope)
+
+        if response.status_code in (200, 304):
+            if os.path.splitext(relative)[1].lower() in COMPRESSIBLE_SUFFIXES:
+                response.headers["Vary"] = "Accept-Encoding"
+            if relative in manifest.values():
+                response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
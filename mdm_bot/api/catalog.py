@@ -0,0 +1,256 @@
+"""
+Catalog readers and in-process catalog snapshot for the API
+"""
+import time
+import asyncio
+import logging
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import Integer, any_, bindparam, exists, select, func
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from mdm_bot.core import (
+    AsyncSessionFactory, Product, ProductStock, settings, get_catalog_version, get_search_sync_point
+)
+from .schemas import ProductResponse
+
+logger = logging.getLogger(__name__)
+
+# Columns needed to build ProductResponse
+PRODUCT_RESPONSE_COLUMNS = (
+    Product.id,
+    Product.name,
+    Product.price,
+    Product.image,
+    Product.vendor_code,
+    Product.description,
+    Product.updated_date,
+)
+
+
+def stock_filters(warehouse_id: Optional[int] = None, in_stock: Optional[bool] = None) -> list:
+    """
+    Build product filters on warehouse stock
+
+    Args:
+        warehouse_id: Limit the check to one warehouse (implies in_stock=True)
+        in_stock: True - has stock, False - has no stock, None - no filter
+    """
+    if warehouse_id is None and in_stock is None:
+        return []
+
+    # product_stock only holds positive quantities, so a row means "in stock"
+    has_stock = exists().where(ProductStock.product_id == Product.id)
+    if warehouse_id is not None:
+        has_stock = has_stock.where(ProductStock.warehouse_id == warehouse_id)
+    return [has_stock if in_stock is not False else ~has_stock]
+
+
+async def count_products(session, filters: Sequence = ()) -> int:
+    """Count active products"""
+    result = await session.execute(
+        select(func.count(Product.id)).where(Product.removed_date.is_(None), *filters))
+    return result.scalar()
+
+
+async def load_products_page(
+    session, offset: int, limit: int, filters: Sequence = (), order_by: Sequence = ()
+) -> List[ProductResponse]:
+    """Load products using OFFSET pagination (ordered by ID unless order_by is given)"""
+    query = (
+        select(*PRODUCT_RESPONSE_COLUMNS)
+        .where(Product.removed_date.is_(None), *filters)
+        .order_by(*(order_by or [Product.id]))
+        .offset(offset)
+        .limit(limit)
+    )
+    result = await session.execute(query)
+    return [ProductResponse.model_validate(row) for row in result]
+
+
+async def load_products_after(session, after_id: int, limit: int, filters: Sequence = ()) -> List[ProductResponse]:
+    """Load products with ID greater than after_id (keyset pagination)"""
+    query = (
+        select(*PRODUCT_RESPONSE_COLUMNS)
+        .where(Product.id > after_id, Product.removed_date.is_(None), *filters)
+        .order_by(Product.id)
+        .limit(limit)
+    )
+    result = await session.execute(query)
+    return [ProductResponse.model_validate(row) for row in result]
+
+
+async def load_products_by_ids(session, product_ids: Sequence[int]) -> Dict[int, ProductResponse]:
+    """Load products by IDs, keyed by product ID"""
+    if not product_ids:
+        return {}
+    # = ANY(array) keeps one prepared statement for any number of IDs (IN would expand per count)
+    ids_param = bindparam("product_ids", list(product_ids), type_=ARRAY(Integer))
+    query = select(*PRODUCT_RESPONSE_COLUMNS).where(
+        Product.id == any_(ids_param), Product.removed_date.is_(None))
+    result = await session.execute(query)
+    return {row.id: ProductResponse.model_validate(row) for row in result}
+
+
+class CatalogSnapshot:
+    """
+    In-memory snapshot of the product catalog.
+
+    Holds the full ordered list of product IDs (and therefore the total count)
+    plus up to `max_items` product cards in an LRU. The catalog version marker
+    is checked at most once per `check_interval` seconds; when it changes the
+    snapshot is rebuilt. Between checks catalog reads don't touch PostgreSQL
+    unless a card was evicted from the LRU. The search sync marker is read
+    along with it, so search results can be keyed by the index state.
+    """
+
+    def __init__(self, max_items: int, check_interval: float):
+        self.max_items = max_items
+        self.check_interval = check_interval
+        self.version: Optional[str] = None
+        self.search_version: Optional[str] = None
+        self.ids: List[int] = []
+        self._products: "OrderedDict[int, ProductResponse]" = OrderedDict()
+        self._loaded = False
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    @property
+    def total(self) -> int:
+        """Total number of products in the snapshot"""
+        return len(self.ids)
+
+    def _is_fresh(self) -> bool:
+        return self._loaded and time.monotonic() - self._checked_at < self.check_interval
+
+    async def refresh(self):
+        """Reload the snapshot if the catalog version marker has changed"""
+        if self._is_fresh():
+            return
+
+        async with self._lock:
+            if self._is_fresh():
+                return
+
+            async with AsyncSessionFactory() as session:
+                version = await get_catalog_version(session)
+                if not self._loaded or version != self.version:
+                    await self._reload(session, version)
+                self.search_version = await get_search_sync_point(session)
+
+            self._checked_at = time.monotonic()
+
+    async def _reload(self, session, version: Optional[str]):
+        """Rebuild ID ordering and warm the product LRU"""
+        result = await session.execute(
+            select(Product.id).where(Product.removed_date.is_(None)).order_by(Product.id))
+        ids = list(result.scalars())
+
+        products = OrderedDict(
+            (p.id, p) for p in await load_products_page(session, 0, self.max_items)
+        )
+
+        # Swap in one step so concurrent readers see a consistent snapshot
+        self.ids, self._products, self.version = ids, products, version
+        self._loaded = True
+        logger.info(f"Catalog snapshot loaded: {len(ids)} products, version {version}")
+
+    def _remember(self, product: ProductResponse):
+        """Put product into LRU, evicting the least recently used ones"""
+        self._products[product.id] = product
+        self._products.move_to_end(product.id)
+        while len(self._products) > self.max_items:
+            self._products.popitem(last=False)
+
+    async def _resolve(self, product_ids: List[int]) -> List[ProductResponse]:
+        """Return products for IDs in order, loading evicted ones from the database"""
+        loaded = {}
+        missing = [pid for pid in product_ids if pid not in self._products]
+        if missing:
+            async with AsyncSessionFactory() as session:
+                loaded = await load_products_by_ids(session, missing)
+            for product in loaded.values():
+                self._remember(product)
+
+        products = []
+        for pid in product_ids:
+            if pid in self._products:
+                self._products.move_to_end(pid)
+                products.append(self._products[pid])
+            elif pid in loaded:
+                products.append(loaded[pid])
+        return products
+
+    async def get_page(self, offset: int, limit: int) -> List[ProductResponse]:
+        """Get products for OFFSET-style page"""
+        await self.refresh()
+        return await self._resolve(self.ids[offset:offset + limit])
+
+    async def get_after(self, after_id: int, limit: int) -> List[ProductResponse]:
+        """Get products with ID greater than after_id"""
+        await self.refresh()
+        start = bisect_right(self.ids, after_id)
+        return await self._resolve(self.ids[start:start + limit])
+
+    async def get_many(self, product_ids: Sequence[int]) -> Dict[int, ProductResponse]:
+        """Get products by IDs, keyed by product ID (unknown IDs are left out)"""
+        await self.refresh()
+        known = []
+        for product_id in product_ids:
+            index = bisect_left(self.ids, product_id)
+            if index < len(self.ids) and self.ids[index] == product_id:
+                known.append(product_id)
+        return {product.id: product for product in await self._resolve(known)}
+
+    async def get(self, product_id: int) -> Optional[ProductResponse]:
+        """Get single product by ID"""
+        await self.refresh()
+        index = bisect_left(self.ids, product_id)
+        if index == len(self.ids) or self.ids[index] != product_id:
+            return None
+        products = await self._resolve([product_id])
+        return products[0] if products else None
+
+    def stats(self) -> dict:
+        """Snapshot statistics for monitoring"""
+        return {
+            "version": self.version,
+            "search_version": self.search_version,
+            "total": self.total,
+            "cached_items": len(self._products),
+            "max_items": self.max_items,
+        }
+
+
+catalog_snapshot = CatalogSnapshot(
+    max_items=settings.CATALOG_CACHE_MAX_ITEMS,
+    check_interval=settings.CATALOG_CACHE_CHECK_INTERVAL,
+)
+
+
+async def read_product(product_id: int) -> Optional[ProductResponse]:
+    """Get active product from the snapshot (from the database when the snapshot is disabled)"""
+    if settings.CATALOG_CACHE_ENABLED:
+        return await catalog_snapshot.get(product_id)
+
+    async with AsyncSessionFactory() as session:
+        return (await load_products_by_ids(session, [product_id])).get(product_id)
+
+
+async def read_products_page(offset: int, limit: int) -> Tuple[List[ProductResponse], int]:
+    """Get unfiltered catalog page and total product count"""
+    if settings.CATALOG_CACHE_ENABLED:
+        return await catalog_snapshot.get_page(offset, limit), catalog_snapshot.total
+
+    async with AsyncSessionFactory() as session:
+        return await load_products_page(session, offset, limit), await count_products(session)
+
+
+async def read_products(product_ids: Sequence[int]) -> Dict[int, ProductResponse]:
+    """Get active products by IDs in one lookup, keyed by product ID"""
+    if settings.CATALOG_CACHE_ENABLED:
+        return await catalog_snapshot.get_many(product_ids)
+
+    async with AsyncSessionFactory() as session:
+        return await load_products_by_ids(session, product_ids)
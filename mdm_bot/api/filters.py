@@ -0,0 +1,137 @@
+"""
+Product list filters and sorting shared by search and catalog endpoints
+"""
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import List, Optional, Tuple
+from fastapi import HTTPException, Query
+from sqlalchemy import ColumnElement
+
+from mdm_bot.core import Product
+from mdm_bot.core.stock import WAREHOUSES_BY_CODE
+from .catalog import stock_filters
+
+# Sort parameter values and their Meilisearch sort rules
+SORT_OPTIONS = {
+    "price_asc": "price:asc",
+    "price_desc": "price:desc",
+}
+
+
+def _meili_string(value: str) -> str:
+    """Quote string value for a Meilisearch filter expression"""
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _meili_number(value: float) -> str:
+    """Format finite number for a Meilisearch filter expression (no exponent notation)"""
+    # repr is the shortest exact form, Decimal spells it out without "1e-05"
+    return format(Decimal(repr(value)), "f")
+
+
+@dataclass(frozen=True)
+class ProductFilters:
+    """
+    Filters and sort order of a product list
+
+    Hashable, so it can be a part of cache keys. The same filters are
+    translated to a Meilisearch filter expression (with facet counts) and to
+    SQL conditions (fallback when the index is unavailable).
+    """
+    vendors: Tuple[str, ...] = ()
+    price_min: Optional[float] = None
+    price_max: Optional[float] = None
+    in_stock: Optional[bool] = None
+    bestseller: Optional[bool] = None
+    warehouse: Optional[str] = None
+    sort: Optional[str] = None
+
+    @property
+    def is_filtered(self) -> bool:
+        """Whether any filter (not sort) is set"""
+        return bool(self.vendors) or any(
+            value is not None
+            for value in (self.price_min, self.price_max, self.in_stock, self.bestseller, self.warehouse)
+        )
+
+    @property
+    def is_empty(self) -> bool:
+        """Whether neither filters nor sort are set"""
+        return not self.is_filtered and self.sort is None
+
+    def meili_filter(self) -> List[str]:
+        """Meilisearch filter expression (list items are ANDed)"""
+        conditions = []
+        if self.vendors:
+            conditions.append("vendor IN [" + ", ".join(_meili_string(v) for v in self.vendors) + "]")
+        if self.price_min is not None:
+            conditions.append(f"price >= {_meili_number(self.price_min)}")
+        if self.price_max is not None:
+            conditions.append(f"price <= {_meili_number(self.price_max)}")
+        if self.bestseller is not None:
+            conditions.append(f"is_bestseller = {str(self.bestseller).lower()}")
+        if self.warehouse is not None:
+            # Same meaning as stock_filters: in_stock=False negates the warehouse check
+            condition = f"warehouses = {_meili_string(self.warehouse)}"
+            conditions.append(condition if self.in_stock is not False else f"NOT {condition}")
+        elif self.in_stock is not None:
+            conditions.append(f"in_stock = {str(self.in_stock).lower()}")
+        return conditions
+
+    def meili_sort(self) -> List[str]:
+        """Meilisearch sort rules, ties are broken by product ID"""
+        if self.sort is None:
+            return []
+        return [SORT_OPTIONS[self.sort], "id:asc"]
+
+    def sql_conditions(self) -> List[ColumnElement]:
+        """SQLAlchemy WHERE conditions on Product"""
+        conditions = []
+        if self.vendors:
+            conditions.append(Product.vendor.in_(self.vendors))
+        if self.price_min is not None:
+            conditions.append(Product.price >= self.price_min)
+        if self.price_max is not None:
+            conditions.append(Product.price <= self.price_max)
+        if self.bestseller is not None:
+            conditions.append(Product.is_bestseller.is_(self.bestseller))
+        warehouse_id = WAREHOUSES_BY_CODE[self.warehouse].id if self.warehouse is not None else None
+        conditions.extend(stock_filters(warehouse_id, self.in_stock))
+        return conditions
+
+    def sql_order(self) -> list:
+        """SQLAlchemy ORDER BY clauses, ties are broken by product ID"""
+        if self.sort == "price_asc":
+            return [Product.price.asc(), Product.id]
+        if self.sort == "price_desc":
+            return [Product.price.desc(), Product.id]
+        return [Product.id]
+
+
+def product_filters(
+    vendor: List[str] = Query([], description="Производитель (можно указать несколько раз)"),
+    price_min: Optional[float] = Query(None, ge=0, allow_inf_nan=False, description="Минимальная цена"),
+    price_max: Optional[float] = Query(None, ge=0, allow_inf_nan=False, description="Максимальная цена"),
+    in_stock: Optional[bool] = Query(None, description="Наличие хотя бы на одном складе"),
+    bestseller: Optional[bool] = Query(None, description="Только хиты продаж (или только не хиты)"),
+    warehouse: Optional[str] = Query(None, description="Только товары в наличии на складе (код склада)"),
+    sort: Optional[str] = Query(None, description="Сортировка: price_asc или price_desc"),
+) -> ProductFilters:
+    """FastAPI dependency parsing and validating filter query parameters"""
+    if warehouse is not None and warehouse not in WAREHOUSES_BY_CODE:
+        raise HTTPException(status_code=400, detail="Неизвестный склад")
+    if sort is not None and sort not in SORT_OPTIONS:
+        raise HTTPException(status_code=400, detail="Неизвестная сортировка")
+    if price_min is not None and price_max is not None and price_min > price_max:
+        raise HTTPException(status_code=400, detail="Минимальная цена больше максимальной")
+
+    return ProductFilters(
+        # Sorted and deduplicated so equal filter sets share cache entries
+        vendors=tuple(sorted({v.strip() for v in vendor if v.strip()})),
+        price_min=price_min,
+        price_max=price_max,
+        in_stock=in_stock,
+        bestseller=bestseller,
+        warehouse=warehouse,
+        sort=sort,
+    )
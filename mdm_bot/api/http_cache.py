@@ -0,0 +1,104 @@
+"""
+HTTP conditional caching of catalog responses
+
+Catalog responses change only when the importer bumps the catalog version, so
+the version marker serves as the ETag of every catalog URL. Answers built
+from the search index also depend on the index sync, which finishes after the
+import commits, so their ETag includes the search sync marker as well. A
+client (or nginx) presenting the current ETag gets 304 without touching the
+database or the search index.
+"""
+import hashlib
+from typing import Optional
+from fastapi import Request, Response
+
+from mdm_bot.core import AsyncSessionFactory, get_catalog_version, get_search_sync_point, settings
+from .catalog import catalog_snapshot
+
+# Bump when the JSON shape of catalog responses changes, so clients drop old copies
+ETAG_REVISION = "2"
+
+
+async def current_catalog_version() -> Optional[str]:
+    """Return catalog version marker (checked by the snapshot when it is enabled)"""
+    if settings.CATALOG_CACHE_ENABLED:
+        await catalog_snapshot.refresh()
+        return catalog_snapshot.version
+
+    async with AsyncSessionFactory() as session:
+        return await get_catalog_version(session)
+
+
+async def current_search_version() -> Optional[str]:
+    """Return search index sync marker (checked by the snapshot when it is enabled)"""
+    if settings.CATALOG_CACHE_ENABLED:
+        await catalog_snapshot.refresh()
+        return catalog_snapshot.search_version
+
+    async with AsyncSessionFactory() as session:
+        return await get_search_sync_point(session)
+
+
+def catalog_etag(version: Optional[str], search_version: Optional[str] = None) -> Optional[str]:
+    """Weak ETag for catalog version and search sync marker (None for an unversioned catalog)"""
+    if version is None:
+        return None
+    if search_version is None:
+        return f'W/"{version}-{ETAG_REVISION}"'
+    search_digest = hashlib.sha1(search_version.encode()).hexdigest()[:12]
+    return f'W/"{version}-{search_digest}-{ETAG_REVISION}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check If-None-Match header against ETag using weak comparison"""
+    if not if_none_match:
+        return False
+
+    def opaque(tag: str) -> str:
+        tag = tag.strip()
+        return tag[2:] if tag.startswith("W/") else tag
+
+    return any(
+        tag.strip() == "*" or opaque(tag) == opaque(etag)
+        for tag in if_none_match.split(",")
+    )
+
+
+def cache_headers(etag: Optional[str]) -> dict:
+    """Cache-Control (and ETag) headers of a catalog response"""
+    headers = {
+        "Cache-Control": (
+            f"public, max-age={settings.HTTP_CACHE_MAX_AGE}, "
+            f"stale-while-revalidate={settings.HTTP_CACHE_STALE_WHILE_REVALIDATE}"
+        ),
+    }
+    if etag is not None:
+        headers["ETag"] = etag
+    return headers
+
+
+async def not_modified(request: Request, response: Response, search: bool = False) -> Optional[Response]:
+    """
+    Add caching headers to the response of a catalog endpoint
+
+    Args:
+        search: Response is built from the search index (ETag follows index syncs too)
+
+    Returns:
+        304 response when the client's copy is current, None otherwise
+    """
+    search_version = await current_search_version() if search else None
+    etag = catalog_etag(await current_catalog_version(), search_version)
+    headers = cache_headers(etag)
+    if etag is not None and etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return None
+
+
+def uncacheable(response: Response):
+    """Drop validators of a degraded answer so clients and nginx don't keep it"""
+    if "etag" in response.headers:
+        del response.headers["ETag"]
+    response.headers["Cache-Control"] = "no-store"
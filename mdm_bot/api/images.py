@@ -0,0 +1,326 @@
+"""
+Product image thumbnails with a bounded on-disk LRU cache
+
+The origin image of a product is downloaded once and resized into every
+size bucket in a worker process; thumbnails are stored on disk under a hash
+of (image URL, size), so a changed product image gets new files and old ones
+age out of the LRU. Only URLs from the catalog are fetched, never
+client-supplied ones.
+"""
+import asyncio
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+import anyio
+import httpx
+from PIL import Image, ImageOps
+
+from mdm_bot.core import settings
+from mdm_bot.core.cache import TTLCache
+from mdm_bot.core.resources import available_cpus, memory_limit
+
+logger = logging.getLogger(__name__)
+
+# Size bucket -> longest side in pixels
+THUMBNAIL_SIZES = {
+    "tile": 320,
+    "detail": 960,
+}
+
+THUMBNAIL_MEDIA_TYPE = "image/webp"
+
+# Refuse decompression bombs (about 50 megapixels)
+Image.MAX_IMAGE_PIXELS = 50_000_000
+
+
+class ImageUnavailable(Exception):
+    """Origin image could not be fetched or decoded"""
+
+
+def make_thumbnails(data: bytes, sizes: Dict[str, int]) -> Dict[str, bytes]:
+    """
+    Decode image once and encode a WebP thumbnail per size bucket (runs in worker processes)
+
+    Raises:
+        ImageUnavailable if the data is not a supported image
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as source:
+            # JPEGs are decoded at a reduced scale when that still covers the largest size
+            largest = max(sizes.values())
+            source.draft(None, (largest, largest))
+            image = ImageOps.exif_transpose(source)
+            image.load()
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise ImageUnavailable(f"Не удалось прочитать изображение: {e}")
+
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+
+    thumbnails = {}
+    for size_name, size in sizes.items():
+        thumbnail = image.copy()
+        # Never upscale: small originals are only re-encoded
+        thumbnail.thumbnail((size, size), Image.Resampling.LANCZOS)
+        output = io.BytesIO()
+        thumbnail.save(output, format="WEBP", quality=settings.IMAGE_QUALITY, method=4)
+        thumbnails[size_name] = output.getvalue()
+    return thumbnails
+
+
+class DiskLRUCache:
+    """
+    Files in a directory bounded by total size, least recently used evicted first.
+
+    Recency survives restarts through file mtimes. Each process keeps its own
+    index, so with several workers files may vanish under a reader (treated
+    as a miss) and the directory may briefly exceed the limit.
+
+    Methods do blocking file I/O: async code calls them in worker threads,
+    the index is guarded by a lock.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def _path(self, name: str) -> Path:
+        # Two-level fan-out keeps directories small
+        return self.directory / name[:2] / name
+
+    def load(self):
+        """Index existing files, oldest first (once at startup)"""
+        files = []
+        if self.directory.exists():
+            for path in self.directory.glob("*/*"):
+                if path.name.startswith(".tmp-"):
+                    continue
+                try:
+                    stat_result = path.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat_result.st_mtime, path.name, stat_result.st_size))
+
+        with self._lock:
+            self._entries.clear()
+            self._total = 0
+            for _, name, size in sorted(files):
+                self._entries[name] = size
+                self._total += size
+            victims = self._evict()
+        self._unlink(victims)
+
+    def _forget(self, name: str):
+        self._total -= self._entries.pop(name, 0)
+
+    def _evict(self) -> List[str]:
+        """Drop least recently used entries over the bound (under the lock), return their names"""
+        victims = []
+        while self._total > self.max_bytes and self._entries:
+            name, _ = next(iter(self._entries.items()))
+            self._forget(name)
+            victims.append(name)
+            self.evictions += 1
+        return victims
+
+    def _unlink(self, names: List[str]):
+        for name in names:
+            self._path(name).unlink(missing_ok=True)
+
+    def get(self, name: str) -> Optional[bytes]:
+        """Return file content or None"""
+        path = self._path(name)
+        try:
+            content = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._forget(name)
+                self.misses += 1
+            return None
+
+        with self._lock:
+            # Files written by another worker join the index on first read
+            self._forget(name)
+            self._entries[name] = len(content)
+            self._total += len(content)
+            self.hits += 1
+        return content
+
+    def set(self, name: str, content: bytes):
+        """Store file (atomically) and evict old ones over the size limit"""
+        path = self._path(name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                tmp.write(content)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        with self._lock:
+            self._forget(name)
+            self._entries[name] = len(content)
+            self._total += len(content)
+            victims = self._evict()
+        self._unlink(victims)
+
+    def stats(self) -> dict:
+        """Cache statistics for monitoring"""
+        return {
+            "entries": len(self._entries),
+            "bytes": self._total,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+def image_revision(image_url: str) -> str:
+    """Short hash of the origin URL, put into thumbnail URLs so a new image gets a new URL"""
+    return hashlib.sha256(image_url.encode()).hexdigest()[:12]
+
+
+def image_worker_count() -> int:
+    """Resize processes per API worker: IMAGE_WORKERS capped by the container's CPUs and memory"""
+    workers = min(settings.IMAGE_WORKERS, available_cpus())
+    limit = memory_limit()
+    if limit is not None:
+        workers = min(workers, limit // settings.IMAGE_WORKER_MEMORY_BYTES)
+    return max(1, workers)
+
+
+def thumbnail_name(image_url: str, size_name: str) -> str:
+    """Cache file name of a thumbnail"""
+    return hashlib.sha256(f"{size_name}:{image_url}".encode()).hexdigest() + ".webp"
+
+
+class ThumbnailService:
+    """Fetch origin images, resize them in a process pool and cache thumbnails on disk"""
+
+    def __init__(self):
+        self.cache = DiskLRUCache(settings.IMAGE_CACHE_DIR, settings.IMAGE_CACHE_MAX_BYTES)
+        # Origins that failed recently are not retried on every request
+        self._failures = TTLCache(max_entries=10000, ttl=settings.IMAGE_ERROR_TTL)
+        # One origin download per image URL, concurrent requests wait for it
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._client: Optional[httpx.AsyncClient] = None
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.origin_fetches = 0
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=settings.IMAGE_FETCH_TIMEOUT,
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=settings.IMAGE_MAX_CONNECTIONS),
+            )
+        return self._client
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Spawned, not forked: forking a process that runs threads can deadlock the children
+            self._executor = ProcessPoolExecutor(
+                max_workers=image_worker_count(),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    async def _fetch_origin(self, image_url: str) -> bytes:
+        """Download origin image with a size limit"""
+        self.origin_fetches += 1
+        try:
+            async with self._get_client().stream("GET", image_url) as response:
+                response.raise_for_status()
+                chunks, size = [], 0
+                async for chunk in response.aiter_bytes():
+                    size += len(chunk)
+                    if size > settings.IMAGE_MAX_SOURCE_BYTES:
+                        raise ImageUnavailable(f"Изображение больше {settings.IMAGE_MAX_SOURCE_BYTES} байт")
+                    chunks.append(chunk)
+                return b"".join(chunks)
+        except httpx.HTTPError as e:
+            raise ImageUnavailable(f"Не удалось загрузить изображение: {e}")
+
+    async def start(self):
+        """Index the thumbnail directory (without blocking the event loop)"""
+        await anyio.to_thread.run_sync(self.cache.load)
+        logger.info(f"Thumbnail cache indexed: {self.cache.stats()}")
+
+    def _store(self, image_url: str, thumbnails: Dict[str, bytes]):
+        for size_name, content in thumbnails.items():
+            self.cache.set(thumbnail_name(image_url, size_name), content)
+
+    async def _build(self, image_url: str) -> Dict[str, bytes]:
+        """Fetch origin and store thumbnails of every size"""
+        data = await self._fetch_origin(image_url)
+        loop = asyncio.get_running_loop()
+        thumbnails = await loop.run_in_executor(self._get_executor(), make_thumbnails, data, THUMBNAIL_SIZES)
+        await anyio.to_thread.run_sync(self._store, image_url, thumbnails)
+        return thumbnails
+
+    async def get(self, image_url: str, size_name: str) -> bytes:
+        """
+        Get thumbnail of the image
+
+        Raises:
+            ImageUnavailable if the origin can't be fetched or decoded
+        """
+        content = await anyio.to_thread.run_sync(self.cache.get, thumbnail_name(image_url, size_name))
+        if content is not None:
+            return content
+
+        error = self._failures.get(image_url)
+        if error is not None:
+            raise ImageUnavailable(error)
+
+        future = self._in_flight.get(image_url)
+        if future is None:
+            future = asyncio.ensure_future(self._build(image_url))
+            self._in_flight[image_url] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(image_url, None))
+
+        try:
+            # Shielded: a disconnected client must not cancel the build for others
+            thumbnails = await asyncio.shield(future)
+        except ImageUnavailable as e:
+            self._failures.set(image_url, str(e))
+            raise
+        return thumbnails[size_name]
+
+    def stats(self) -> dict:
+        """Thumbnail statistics for monitoring"""
+        return {
+            **self.cache.stats(),
+            "origin_fetches": self.origin_fetches,
+            "in_flight": len(self._in_flight),
+        }
+
+    async def close(self):
+        """Close HTTP client and stop worker processes"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+thumbnail_service = ThumbnailService()
@@ -0,0 +1,73 @@
+"""
+Server-side rendered catalog pages and the rendered fragment cache
+"""
+import math
+from typing import Optional, Tuple
+from fastapi.templating import Jinja2Templates
+
+from mdm_bot.core import settings
+from mdm_bot.core.cache import TTLCache
+from .assets import static_url
+from .catalog import read_product, read_products_page
+from .http_cache import current_catalog_version
+
+# Products on a catalog page (the page script continues with the same size)
+CATALOG_PAGE_SIZE = 10
+
+
+def format_price(price: float) -> str:
+    """Format price the way the page script does (ru-RU toLocaleString)"""
+    integer, _, fraction = f"{price:,.3f}".partition(".")
+    fraction = fraction.rstrip("0")
+    text = integer.replace(",", " ")
+    return f"{text},{fraction}" if fraction else text
+
+
+# Setup Jinja2 templates
+templates = Jinja2Templates(directory="templates")
+templates.env.filters["price"] = format_price
+templates.env.globals["static_url"] = static_url
+
+# Rendered HTML keyed by product revision (product pages) or catalog version (listing pages),
+# so an import never serves stale markup
+fragment_cache = TTLCache(
+    max_entries=settings.FRAGMENT_CACHE_MAX_ENTRIES,
+    ttl=settings.FRAGMENT_CACHE_TTL,
+)
+
+
+async def render_product_fragment(product_id: int) -> Optional[str]:
+    """
+    Render product detail markup
+
+    Returns:
+        HTML fragment, None if the product does not exist
+    """
+    product = await read_product(product_id)
+    if product is None:
+        return None
+
+    # Keyed by the product row, so an import keeps pages of unchanged products
+    cache_key = ("product", product_id, product.updated_date)
+    html = fragment_cache.get(cache_key)
+    if html is None:
+        html = templates.get_template("partials/product_detail.html").render(product=product)
+        fragment_cache.set(cache_key, html)
+    return html
+
+
+async def render_catalog_fragment(page: int = 1) -> Tuple[str, int]:
+    """
+    Render product cards of an unfiltered catalog page
+
+    Returns:
+        HTML fragment and total number of pages
+    """
+    cache_key = ("catalog", page, CATALOG_PAGE_SIZE, await current_catalog_version())
+    fragment = fragment_cache.get(cache_key)
+    if fragment is None:
+        products, total = await read_products_page((page - 1) * CATALOG_PAGE_SIZE, CATALOG_PAGE_SIZE)
+        html = templates.get_template("partials/product_cards.html").render(products=products)
+        fragment = (html, math.ceil(total / CATALOG_PAGE_SIZE))
+        fragment_cache.set(cache_key, fragment)
+    return fragment
@@ -0,0 +1,70 @@
+"""
+Fast JSON responses and the encoded response cache
+
+Returning a Response from an endpoint skips FastAPI's response_model
+re-validation and jsonable_encoder, which dominate the cost of large product
+pages; models are dumped to plain dicts and encoded by orjson instead.
+"""
+from typing import Any, Optional
+import orjson
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from mdm_bot.core import settings
+from mdm_bot.core.cache import TTLCache
+
+# Encoded bodies of catalog responses, keyed by URL and catalog ETag
+encoded_cache = TTLCache(
+    max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+    ttl=settings.RESPONSE_CACHE_TTL,
+)
+
+
+def dump_json(content: Any) -> bytes:
+    """Encode response content (pydantic model or plain data) to JSON bytes"""
+    if isinstance(content, BaseModel):
+        content = content.model_dump()
+    return orjson.dumps(content)
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response encoded with orjson"""
+
+    def render(self, content: Any) -> bytes:
+        return dump_json(content)
+
+
+def _cache_key(request: Request, response: Response) -> Optional[tuple]:
+    # Without an ETag the response is not tied to a catalog version and is not cached
+    etag = response.headers.get("etag")
+    if etag is None:
+        return None
+    return request.url.path, tuple(sorted(request.query_params.multi_items())), etag
+
+
+def _json_bytes_response(body: bytes, response: Response) -> Response:
+    # Headers set on the injected response (ETag, Cache-Control) are not applied
+    # by FastAPI when a Response is returned, so they are copied
+    return Response(content=body, media_type="application/json", headers=dict(response.headers))
+
+
+def cached_json(request: Request, response: Response) -> Optional[Response]:
+    """Return cached encoded response for this URL and catalog version, if any"""
+    key = _cache_key(request, response)
+    body = encoded_cache.get(key) if key is not None else None
+    return _json_bytes_response(body, response) if body is not None else None
+
+
+def json_response(request: Request, response: Response, content: Any, cache: bool = True) -> Response:
+    """
+    Encode response content, remembering the bytes for repeated requests
+
+    Args:
+        cache: Store encoded body (only responses with a catalog ETag are stored)
+    """
+    body = dump_json(content)
+    key = _cache_key(request, response) if cache else None
+    if key is not None:
+        encoded_cache.set(key, body)
+    return _json_bytes_response(body, response)
@@ -0,0 +1,68 @@
+"""
+Pydantic models for API responses
+"""
+import datetime
+from typing import Dict, List, Optional
+from pydantic import BaseModel, Field, computed_field
+
+from .images import image_revision
+
+
+class ProductResponse(BaseModel):
+    id: int
+    name: str
+    price: float
+    image: Optional[str] = None
+    vendor_code: Optional[str] = None
+    description: Optional[str] = None
+    # Row revision for fragment cache keys, not part of the JSON
+    updated_date: Optional[datetime.datetime] = Field(None, exclude=True)
+
+    @computed_field
+    @property
+    def image_version(self) -> Optional[str]:
+        """Revision of the thumbnail URLs (/api/images/{id}/{size}?v=...)"""
+        return image_revision(self.image) if self.image else None
+
+    class Config:
+        from_attributes = True
+
+
+class FacetStats(BaseModel):
+    min: float
+    max: float
+
+
+class ProductsListResponse(BaseModel):
+    items: List[ProductResponse]
+    total: Optional[int] = None
+    page: Optional[int] = None
+    limit: int
+    total_pages: Optional[int] = None
+    next_cursor: Optional[str] = None
+    # Facet counts of the whole filtered list (only when answered by the search index)
+    facets: Optional[Dict[str, Dict[str, int]]] = None
+    facet_stats: Optional[Dict[str, FacetStats]] = None
+
+
+class ProductsBatchRequest(BaseModel):
+    ids: List[int]
+
+
+class ProductsBatchResponse(BaseModel):
+    items: List[ProductResponse]
+    # Requested IDs that are not in the catalog, in request order
+    missing: List[int]
+
+
+class SearchResponse(BaseModel):
+    items: List[ProductResponse]
+    total: int
+    query: str
+    facets: Optional[Dict[str, Dict[str, int]]] = None
+    facet_stats: Optional[Dict[str, FacetStats]] = None
+
+
+class WarehouseResponse(BaseModel):
+    code: str
+    name: str
@@ -1,16 +1,45 @@
 """
 Main bot application entry point
+
+BOT_MODE=polling (default) runs a single getUpdates loop. BOT_MODE=webhook
+receives updates over HTTP in WEBHOOK_WORKERS processes sharing one port
+(SO_REUSEPORT); the webhook is registered with Telegram once, by the parent
+process.
 """
 import asyncio
 import logging
+import multiprocessing
+import signal
+from typing import Optional
+from aiohttp import web
 from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 from art import tprint
 
 from mdm_bot.core import create_tables, settings
+from mdm_bot.core.users import user_write_behind
 from mdm_bot.handlers import start_router
+from mdm_bot.middlewares import ConcurrencyMiddleware, SendRateLimitMiddleware
 
 logger = logging.getLogger(__name__)
 
+# Processes sharing the bot token's global send budget
+SEND_WORKERS = settings.WEBHOOK_WORKERS if settings.BOT_MODE == "webhook" else 1
+
+# Per-process limits on incoming updates and outgoing requests. BOT_SEND_RATE is
+# the total for the bot, so each webhook worker gets its share. The per-chat
+# interval and send ordering hold only within one worker: updates of a chat may
+# land on any worker (SO_REUSEPORT balances connections, not chats)
+update_limiter = ConcurrencyMiddleware(limit=settings.BOT_MAX_CONCURRENT_UPDATES)
+send_limiter = SendRateLimitMiddleware(
+    rate=settings.BOT_SEND_RATE / SEND_WORKERS,
+    chat_interval=settings.BOT_CHAT_SEND_INTERVAL,
+    max_retries=settings.BOT_SEND_MAX_RETRIES,
+)
+
+# Periodic statistics logging of this process
+stats_task: Optional[asyncio.Task] = None
+
 
 def setup_logging():
     """Configure logging for the bot"""
@@ -18,34 +47,174 @@ def setup_logging():
         filename='mdm_bot.log',
         level=logging.INFO,
         encoding='utf-8',
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+        format='%(asctime)s - %(name)s - %(levelname)s - %(processName)s - %(message)s'
     )
 
 
-async def main() -> None:
-    """Initialize and start the bot"""
-    # Setup logging
-    setup_logging()
-    logger.info('Bot started')
+def queue_stats() -> dict:
+    """Update and send queue statistics of this process"""
+    return {
+        "updates": update_limiter.stats(),
+        "sends": send_limiter.stats(),
+    }
 
-    # Print banner
-    tprint("MDM BOT")
 
-    # Create database tables
+async def log_stats(interval: float):
+    """Log queue statistics every interval seconds (polling mode has no /stats endpoint)"""
+    while True:
+        await asyncio.sleep(interval)
+        logger.info(f"Queue stats: {queue_stats()}")
+
+
+async def on_startup():
+    """Prepare database and background tasks (runs in every worker)"""
+    global stats_task
+
     await create_tables()
     logger.info("Database tables created")
 
-    # Create bot and dispatcher
+    # Background user registration
+    user_write_behind.start()
+
+    if settings.BOT_STATS_LOG_INTERVAL > 0:
+        stats_task = asyncio.create_task(log_stats(settings.BOT_STATS_LOG_INTERVAL))
+
+
+async def on_shutdown():
+    """Stop statistics logging and flush pending background writes"""
+    global stats_task
+
+    if stats_task is not None:
+        stats_task.cancel()
+        stats_task = None
+    await user_write_behind.stop()
+
+
+def create_bot() -> Bot:
+    """Create bot whose requests go through the send rate limiter"""
     bot = Bot(token=settings.BOT_TOKEN)
+    bot.session.middleware(send_limiter)
+    return bot
+
+
+def create_dispatcher() -> Dispatcher:
+    """Create dispatcher with routers, middlewares and lifecycle hooks"""
     dp = Dispatcher()
+    dp.update.outer_middleware(update_limiter)
 
     # Register routers
     dp.include_router(start_router)
 
-    # Start polling
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+    return dp
+
+
+def get_webhook_url() -> str:
+    """Public URL Telegram sends updates to"""
+    base_url = settings.WEBHOOK_BASE_URL or settings.WEBAPP_URL
+    return base_url.rstrip("/") + settings.WEBHOOK_PATH
+
+
+async def run_polling():
+    """Receive updates with long polling"""
+    bot = create_bot()
+    dp = create_dispatcher()
+
+    # A webhook left over from webhook mode makes getUpdates fail
+    await bot.delete_webhook()
+
     logger.info("Starting bot polling...")
     await dp.start_polling(bot)
 
 
+async def set_webhook():
+    """Register webhook URL and secret with Telegram"""
+    bot = Bot(token=settings.BOT_TOKEN)
+    try:
+        await bot.set_webhook(
+            url=get_webhook_url(),
+            secret_token=settings.WEBHOOK_SECRET,
+            allowed_updates=create_dispatcher().resolve_used_update_types(),
+        )
+        logger.info(f"Webhook set to {get_webhook_url()}")
+    finally:
+        await bot.session.close()
+
+
+async def handle_stats(request: web.Request) -> web.Response:
+    """Update and send queue statistics of this worker"""
+    return web.json_response(queue_stats())
+
+
+def run_webhook_worker():
+    """Serve webhook requests in this process until SIGINT/SIGTERM"""
+    setup_logging()
+    bot = create_bot()
+    dp = create_dispatcher()
+
+    app = web.Application()
+    # Requests without the matching X-Telegram-Bot-Api-Secret-Token header get 401
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=settings.WEBHOOK_SECRET,
+    ).register(app, path=settings.WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+    # Worker statistics (not proxied by nginx)
+    app.router.add_get("/stats", handle_stats)
+
+    logger.info(f"Webhook worker listening on {settings.WEBHOOK_HOST}:{settings.WEBHOOK_PORT}")
+    web.run_app(
+        app,
+        host=settings.WEBHOOK_HOST,
+        port=settings.WEBHOOK_PORT,
+        reuse_port=True,
+        print=None,
+    )
+
+
+def run_webhook():
+    """Register webhook and run worker processes"""
+    if not settings.WEBHOOK_SECRET:
+        raise ValueError("WEBHOOK_SECRET must be set in webhook mode")
+
+    asyncio.run(set_webhook())
+
+    workers = [
+        multiprocessing.Process(target=run_webhook_worker, name=f"webhook-{number}")
+        for number in range(1, settings.WEBHOOK_WORKERS + 1)
+    ]
+    for worker in workers:
+        worker.start()
+
+    # Forward stop signals so every worker shuts down gracefully
+    def stop_workers(signum, frame):
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+
+    signal.signal(signal.SIGTERM, stop_workers)
+    signal.signal(signal.SIGINT, stop_workers)
+
+    for worker in workers:
+        worker.join()
+
+
+def main() -> None:
+    """Initialize and start the bot"""
+    # Setup logging
+    setup_logging()
+    logger.info('Bot started')
+
+    # Print banner
+    tprint("MDM BOT")
+
+    if settings.BOT_MODE == "webhook":
+        run_webhook()
+    else:
+        asyncio.run(run_polling())
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    main()
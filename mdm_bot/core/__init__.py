@@ -3,14 +3,18 @@ Core modules: database, models, config, search
 """
 
 from .config import settings
-from .database import AsyncSessionFactory, create_tables
-from .models import User, Product, CartItem, Favorite, Orders, OrderItems, Reviews
+from .database import AsyncSessionFactory, create_tables, get_pool_stats
+from .models import (
+    User, Product, CartItem, Favorite, Orders, OrderItems, Reviews, CatalogMeta, Warehouse, ProductStock
+)
+from .catalog import get_catalog_version, get_search_sync_point, bump_catalog_version
 from .search import MeiliSearchClient, get_meili_client
 
 __all__ = [
     "settings",
     "AsyncSessionFactory",
     "create_tables",
+    "get_pool_stats",
     "User",
     "Product",
     "CartItem",
@@ -18,6 +22,12 @@ __all__ = [
     "Orders",
     "OrderItems",
     "Reviews",
+    "CatalogMeta",
+    "Warehouse",
+    "ProductStock",
+    "get_catalog_version",
+    "get_search_sync_point",
+    "bump_catalog_version",
     "MeiliSearchClient",
     "get_meili_client",
 ]
@@ -0,0 +1,53 @@
+"""
+Catalog markers shared by the importer, search sync and catalog readers
+"""
+import datetime
+import uuid
+from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from .models import CatalogMeta
+
+CATALOG_VERSION_KEY = "catalog_version"
+SEARCH_SYNC_POINT_KEY = "search_synced_at"
+SEARCH_DOCUMENT_VERSION_KEY = "search_document_version"
+
+
+async def get_catalog_meta(session, key: str) -> Optional[str]:
+    """Return catalog marker value (None if it was never set)"""
+    result = await session.execute(
+        select(CatalogMeta.value).where(CatalogMeta.key == key))
+    return result.scalar_one_or_none()
+
+
+async def set_catalog_meta(session, key: str, value: str):
+    """Insert or update catalog marker (caller commits)"""
+    stmt = insert(CatalogMeta).values(key=key, value=value)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CatalogMeta.key],
+        set_={"value": value, "updated_date": datetime.datetime.now()},
+    )
+    await session.execute(stmt)
+
+
+async def get_catalog_version(session) -> Optional[str]:
+    """Return current catalog version marker (None if catalog was never versioned)"""
+    return await get_catalog_meta(session, CATALOG_VERSION_KEY)
+
+
+async def get_search_sync_point(session) -> Optional[str]:
+    """Return marker of the last completed search index sync (None before the first sync)"""
+    return await get_catalog_meta(session, SEARCH_SYNC_POINT_KEY)
+
+
+async def bump_catalog_version(session) -> str:
+    """
+    Set a new catalog version marker.
+
+    Must be called in the same transaction that changes products, so readers
+    never see new data under an old version.
+    """
+    version = uuid.uuid4().hex
+    await set_catalog_meta(session, CATALOG_VERSION_KEY, version)
+    return version
@@ -15,9 +15,83 @@ class Settings(BaseSettings):
     MEILI_PORT: str = "7700"
     MEILI_MASTER_KEY: str = ""
     MEILI_ENV: str = "development"
+    MEILI_TIMEOUT: float = 5.0  # Default per-request timeout, seconds
+    MEILI_SEARCH_TIMEOUT: float = 2.0  # Timeout for search requests, seconds
+    MEILI_TASK_TIMEOUT: float = 60.0  # Max wait for indexing task, seconds
+    MEILI_INIT_RETRY_INTERVAL: float = 5.0  # First retry delay after failed index initialization, seconds
+    MEILI_INIT_RETRY_MAX_INTERVAL: float = 300.0  # Retry delay doubles up to this
+    SEARCH_FROM_INDEX: bool = True  # Build /api/search responses from index documents
+    SEARCH_CACHE_TTL: float = 60.0  # Seconds a cached search response lives
+    SEARCH_CACHE_MAX_ENTRIES: int = 1000
+    SEARCH_MAX_TOTAL_HITS: int = 100000  # Matches reachable by paginated (filtered) listing
+    MEILI_SYNC_BATCH_SIZE: int = 1000  # Documents per indexing task
+    MEILI_SYNC_MAX_IN_FLIGHT: int = 4  # Indexing tasks enqueued before waiting for the oldest
+    MEILI_SYNC_OVERLAP: float = 300.0  # Delta sync re-reads changes this many seconds before the sync point
+    MEILI_MAX_CONNECTIONS: int = 20
+    MEILI_MAX_KEEPALIVE_CONNECTIONS: int = 10
     WEBAPP_URL: str = "http://localhost:8000"
     ALLOWED_ORIGINS: str = "*"  # Comma-separated list for production
 
+    # PostgreSQL connection pool (per process)
+    DB_POOL_SIZE: int = 5  # Connections kept open
+    DB_MAX_OVERFLOW: int = 10  # Extra connections opened under load
+    DB_POOL_TIMEOUT: float = 30.0  # Max wait for a free connection, seconds
+    DB_POOL_RECYCLE: int = 1800  # Reconnect connections older than this, seconds (-1 disables)
+    DB_POOL_PRE_PING: bool = True  # Check connection liveness on checkout
+    DB_STATEMENT_CACHE_SIZE: int = 100  # Prepared statements cached per connection (0 for pgbouncer)
+
+    # In-process catalog snapshot used by the API
+    CATALOG_CACHE_ENABLED: bool = True
+    CATALOG_CACHE_MAX_ITEMS: int = 10000  # Product cards kept in memory (LRU)
+    CATALOG_CACHE_CHECK_INTERVAL: float = 30.0  # Seconds between catalog version checks
+    HTTP_CACHE_MAX_AGE: int = 30  # Seconds clients and nginx reuse catalog responses without revalidation
+    HTTP_CACHE_STALE_WHILE_REVALIDATE: int = 300  # Seconds a stale response may be served while revalidating
+    FRAGMENT_CACHE_MAX_ENTRIES: int = 5000  # Rendered product/catalog HTML fragments kept in memory
+    FRAGMENT_CACHE_TTL: float = 3600.0  # Seconds a rendered fragment lives (keys include product revision or catalog version)
+    RESPONSE_CACHE_MAX_ENTRIES: int = 500  # Encoded JSON bodies of catalog responses kept in memory
+    RESPONSE_CACHE_TTL: float = 60.0  # Seconds an encoded response lives (keys include catalog version)
+    PRODUCTS_BATCH_MAX_IDS: int = 300  # Max product IDs per /api/products/batch request
+    STATIC_BUILD_DIR: str = "static_build"  # Fingerprinted and precompressed copies of static/
+
+    # Product image thumbnails (api)
+    IMAGE_CACHE_DIR: str = "image_cache"  # On-disk thumbnail cache
+    IMAGE_CACHE_MAX_BYTES: int = 512 * 1024 * 1024  # Least recently used thumbnails are evicted above this
+    IMAGE_WORKERS: int = 1  # Processes resizing images per API worker (capped by container CPUs/memory)
+    IMAGE_WORKER_MEMORY_BYTES: int = 256 * 1024 * 1024  # Memory budgeted per resize process
+    IMAGE_QUALITY: int = 80  # WebP quality of thumbnails
+    IMAGE_FETCH_TIMEOUT: float = 10.0  # Seconds to download an origin image
+    IMAGE_MAX_CONNECTIONS: int = 20  # Concurrent origin downloads
+    IMAGE_MAX_SOURCE_BYTES: int = 15 * 1024 * 1024  # Larger origin images are refused
+    IMAGE_ERROR_TTL: float = 300.0  # Seconds before a failed origin image is retried
+    IMAGE_CACHE_CONTROL_MAX_AGE: int = 86400  # Browser/nginx cache lifetime of thumbnail URLs with ?v= revision
+
+    # Bot update delivery
+    BOT_MODE: str = "polling"  # polling | webhook
+    WEBHOOK_BASE_URL: str = ""  # Public HTTPS URL of nginx (WEBAPP_URL when empty)
+    WEBHOOK_PATH: str = "/telegram/webhook"
+    WEBHOOK_SECRET: str = ""  # Checked against X-Telegram-Bot-Api-Secret-Token, required for webhook
+    WEBHOOK_HOST: str = "0.0.0.0"
+    WEBHOOK_PORT: int = 8080
+    WEBHOOK_WORKERS: int = 2  # Processes serving the webhook
+
+    # Bot update processing and outgoing request budgets
+    BOT_MAX_CONCURRENT_UPDATES: int = 100  # Updates handled at once per process
+    BOT_SEND_RATE: float = 25.0  # Requests to chats per second, total over webhook workers (Telegram allows about 30)
+    BOT_CHAT_SEND_INTERVAL: float = 1.0  # Min seconds between requests to one chat (per process)
+    BOT_SEND_MAX_RETRIES: int = 3  # Retries after Telegram flood control (RetryAfter)
+    BOT_STATS_LOG_INTERVAL: float = 300.0  # Seconds between update/send queue statistics log lines (0 disables)
+
+    # /start user registration write-behind (bot)
+    USER_WRITE_BEHIND_INTERVAL: float = 1.0  # Seconds between flushes
+    USER_WRITE_BEHIND_BATCH_SIZE: int = 500  # Users per upsert statement
+
+    # Per-user favorites/cart membership cache used by product keyboards (bot)
+    MEMBERSHIP_CACHE_TTL: float = 300.0  # Seconds before a user's sets are reloaded
+    MEMBERSHIP_CACHE_MAX_USERS: int = 10000
+
+    # CSV import (scripts/import_csv.py)
+    IMPORT_MAX_WORKERS: int = 8  # Upper bound on default row conversion processes (--workers overrides)
+
     model_config = SettingsConfigDict(
         env_file=os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), ".env")
     )
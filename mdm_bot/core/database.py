@@ -1,5 +1,11 @@
+import time
+import logging
+from sqlalchemy import exc
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.util.queue import AsyncAdaptedQueue
 from .models import Base
+from .migrations import apply_migrations, lock_migrations
 from .config import settings
 
 
@@ -11,8 +17,72 @@ def get_database_url() -> str:
     )
 
 
-# Create async engine
-async_engine = create_async_engine(get_database_url(), echo=False)
+class MonitoredQueue(AsyncAdaptedQueue):
+    """Pool queue that records how long takers wait for a returned connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def get(self, block=True, timeout=None):
+        # Opening a new connection happens outside the queue, so it is not counted
+        started = time.perf_counter()
+        try:
+            return super().get(block, timeout)
+        finally:
+            waited = time.perf_counter() - started
+            self.wait_time_total += waited
+            self.wait_time_max = max(self.wait_time_max, waited)
+
+
+class MonitoredQueuePool(AsyncAdaptedQueuePool):
+    """Connection pool that records checkouts, timeouts and time spent waiting for a free connection"""
+
+    _queue_class = MonitoredQueue
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+
+    @property
+    def wait_time_total(self) -> float:
+        return self._pool.wait_time_total
+
+    @property
+    def wait_time_max(self) -> float:
+        return self._pool.wait_time_max
+
+    def _do_get(self):
+        self.checkouts += 1
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+
+
+# SQLAlchemy names pool loggers after the pool class; keep ours as quiet as sqlalchemy.pool
+logging.getLogger(f"{__name__}.{MonitoredQueuePool.__name__}").setLevel(logging.WARNING)
+
+
+# Create async engine (pool is per process: bot and API size it via their own env)
+async_engine = create_async_engine(
+    get_database_url(),
+    echo=False,
+    poolclass=MonitoredQueuePool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+    connect_args={
+        # SQLAlchemy adapter cache and asyncpg's own cache (used by raw driver calls)
+        "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+    },
+)
 
 # Session factory
 AsyncSessionFactory = async_sessionmaker(
@@ -22,7 +92,31 @@ AsyncSessionFactory = async_sessionmaker(
 )
 
 
+def get_pool_stats() -> dict:
+    """Connection pool statistics for monitoring"""
+    pool = async_engine.pool
+    stats = {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+    }
+    if isinstance(pool, MonitoredQueuePool):
+        stats.update({
+            "checkouts": pool.checkouts,
+            "timeouts": pool.timeouts,
+            "wait_time_total": round(pool.wait_time_total, 6),
+            "wait_time_avg": round(pool.wait_time_total / pool.checkouts, 6) if pool.checkouts else 0.0,
+            "wait_time_max": round(pool.wait_time_max, 6),
+        })
+    return stats
+
+
 async def create_tables():
-    """Create all database tables"""
+    """Create missing tables and apply pending schema migrations"""
     async with async_engine.begin() as conn:
+        # Bot, API and scripts may start at the same time
+        await lock_migrations(conn)
         await conn.run_sync(Base.metadata.create_all)
+        await apply_migrations(conn)
@@ -0,0 +1,141 @@
+"""
+Versioned schema migrations
+
+Base.metadata.create_all() only creates missing tables, so every change to an
+existing table (column, index, constraint) is added here as a new migration
+with the next version number. Pending migrations are applied in order, each
+exactly once, and recorded in the schema_migrations table.
+
+On a fresh database create_all() has already built the current schema, so
+migration statements must be idempotent (IF NOT EXISTS and the like). Index
+names must match the ones SQLAlchemy generates for the models.
+"""
+import logging
+from typing import List, NamedTuple, Sequence
+from sqlalchemy import text
+
+from .stock import WAREHOUSES
+
+logger = logging.getLogger(__name__)
+
+# Key of the PostgreSQL advisory lock serializing concurrent migration runs
+MIGRATIONS_LOCK_ID = 720_310_001
+
+
+def _quote(value: str) -> str:
+    """Quote string literal for migration SQL"""
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _stock_quantity_sql(column: str) -> str:
+    """SQL version of stock.parse_stock_quantity for the text stock columns"""
+    return (
+        f"CASE WHEN {column} ~ '\\d' THEN substring({column} from '\\d+')::int "
+        f"WHEN lower(trim(COALESCE({column}, ''))) IN ('', '-', 'нет', '0') THEN 0 ELSE 1 END"
+    )
+
+
+# Text stock columns replaced by product_stock: (warehouse id, column)
+_STOCK_TEXT_COLUMNS = [
+    (1, "stock_chashnikovo"),
+    (2, "stock_kantemirovskaya"),
+    (3, "stock_spb"),
+    (4, "stock_voronezh"),
+    (5, "stock_korolev"),
+    (6, "stock_krasnodar"),
+    (7, "stock_kazan"),
+    (8, "stock_online"),
+]
+
+
+class Migration(NamedTuple):
+    """Single schema migration"""
+    version: int
+    name: str
+    statements: Sequence[str]
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "product change tracking", [
+        "ALTER TABLE products ADD COLUMN IF NOT EXISTS updated_date TIMESTAMP WITHOUT TIME ZONE",
+        "UPDATE products SET updated_date = COALESCE(created_date, now()) WHERE updated_date IS NULL",
+        "ALTER TABLE products ADD COLUMN IF NOT EXISTS removed_date TIMESTAMP WITHOUT TIME ZONE",
+        "CREATE INDEX IF NOT EXISTS ix_products_updated_date ON products (updated_date)",
+    ]),
+    Migration(2, "product import row hash", [
+        "ALTER TABLE products ADD COLUMN IF NOT EXISTS row_hash VARCHAR(32)",
+    ]),
+    Migration(3, "lookup indexes and unique cart rows", [
+        # Merge duplicate cart rows into the oldest one before adding the unique index
+        "UPDATE cart_items AS c SET quantity = d.quantity "
+        "FROM (SELECT min(id) AS id, sum(COALESCE(quantity, 1)) AS quantity FROM cart_items "
+        "      GROUP BY user_id, product_id HAVING count(*) > 1) AS d "
+        "WHERE c.id = d.id",
+        "DELETE FROM cart_items AS c USING cart_items AS k "
+        "WHERE c.user_id = k.user_id AND c.product_id = k.product_id AND c.id > k.id",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_cart_items_user_product ON cart_items (user_id, product_id)",
+        "CREATE INDEX IF NOT EXISTS ix_orders_user_id ON orders (user_id)",
+        "CREATE INDEX IF NOT EXISTS ix_order_items_order_id ON order_items (order_id)",
+        "CREATE INDEX IF NOT EXISTS ix_products_vendor_code ON products (vendor_code)",
+        "CREATE INDEX IF NOT EXISTS ix_products_category_id ON products (category_id)",
+    ]),
+    Migration(4, "numeric warehouse stock", [
+        "INSERT INTO warehouses (id, code, name) VALUES "
+        + ", ".join(f"({w.id}, {_quote(w.code)}, {_quote(w.name)})" for w in WAREHOUSES)
+        + " ON CONFLICT (id) DO NOTHING",
+        # Move text stock columns (absent on databases created after this migration)
+        "DO $$ BEGIN "
+        "IF EXISTS (SELECT 1 FROM information_schema.columns "
+        "           WHERE table_name = 'products' AND column_name = 'stock_online') THEN "
+        "INSERT INTO product_stock (product_id, warehouse_id, quantity) "
+        "SELECT p.id, s.warehouse_id, s.quantity FROM products AS p CROSS JOIN LATERAL (VALUES "
+        + ", ".join(f"({warehouse_id}, {_stock_quantity_sql('p.' + column)})"
+                    for warehouse_id, column in _STOCK_TEXT_COLUMNS)
+        + ") AS s (warehouse_id, quantity) WHERE s.quantity > 0 "
+        "ON CONFLICT DO NOTHING; "
+        "END IF; END $$",
+        "ALTER TABLE products "
+        + ", ".join(f"DROP COLUMN IF EXISTS {column}" for _, column in _STOCK_TEXT_COLUMNS),
+    ]),
+]
+
+
+async def lock_migrations(conn):
+    """Serialize schema changes across processes until the transaction ends"""
+    await conn.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": MIGRATIONS_LOCK_ID})
+
+
+async def get_applied_versions(conn) -> List[int]:
+    """Return versions of applied migrations"""
+    await conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, "
+        "name VARCHAR NOT NULL, "
+        "applied_date TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT now())"
+    ))
+    result = await conn.execute(text("SELECT version FROM schema_migrations ORDER BY version"))
+    return list(result.scalars())
+
+
+async def apply_migrations(conn) -> List[Migration]:
+    """
+    Apply pending migrations in the caller's transaction
+
+    Returns:
+        Migrations applied by this call
+    """
+    applied_versions = set(await get_applied_versions(conn))
+    applied = []
+    for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+        if migration.version in applied_versions:
+            continue
+
+        logger.info(f"Applying migration {migration.version}: {migration.name}")
+        for statement in migration.statements:
+            await conn.execute(text(statement))
+        await conn.execute(
+            text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name)"),
+            {"version": migration.version, "name": migration.name}
+        )
+        applied.append(migration)
+    return applied
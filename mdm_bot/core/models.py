@@ -1,6 +1,6 @@
 import datetime
 from typing import List, Optional
-from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Integer, PrimaryKeyConstraint
+from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Index, Integer, PrimaryKeyConstraint
 from sqlalchemy import String
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
@@ -27,6 +27,9 @@ class Favorite(Base):
 class CartItem(Base):
     """Shopping cart items"""
     __tablename__ = 'cart_items'
+    __table_args__ = (
+        Index('uq_cart_items_user_product', 'user_id', 'product_id', unique=True),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.telegram_id'))
@@ -39,53 +42,79 @@ class CartItem(Base):
 
 
 class Product(Base):
-    """Store product catalog"""
+    """
+    Store product catalog
+
+    Columns nobody reads through the ORM (URL, wholesale and BYN prices) are
+    deferred and raise on access: load them explicitly with
+    undefer() or select the columns directly.
+    """
     __tablename__ = 'products'
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    url: Mapped[str] = mapped_column(String())  # URL товара
+    url: Mapped[str] = mapped_column(String(), deferred=True, deferred_raiseload=True)  # URL товара
     name: Mapped[str] = mapped_column(String())  # Название товара
-    vendor_code: Mapped[str] = mapped_column(String())  # Код поставщика
+    vendor_code: Mapped[str] = mapped_column(String(), index=True)  # Код поставщика
     price: Mapped[float] = mapped_column(Float())  # Цена в рублях
     currency_id: Mapped[str] = mapped_column(String())  # Валюта (например, "RUR")
-    category_id: Mapped[int] = mapped_column(Integer)  # ID категории
+    category_id: Mapped[int] = mapped_column(Integer, index=True)  # ID категории
     model: Mapped[str] = mapped_column(String())  # Модель товара
     vendor: Mapped[str] = mapped_column(String())  # Производитель
     description: Mapped[Optional[str]] = mapped_column(String(), nullable=True)  # Описание товара
     manufacturer_warranty: Mapped[bool] = mapped_column(Boolean())  # Гарантия производителя
     image: Mapped[str] = mapped_column(String())  # URL изображения (первое из списка Pictures)
-    opt_price: Mapped[Optional[float]] = mapped_column(Float(), nullable=True)  # Оптовая цена (Цена ОПТ, RUR)
+    opt_price: Mapped[Optional[float]] = mapped_column(Float(), nullable=True, deferred=True, deferred_raiseload=True)  # Оптовая цена (Цена ОПТ, RUR)
     is_bestseller: Mapped[bool] = mapped_column(Boolean())  # Хит продаж (True/False)
     unit: Mapped[str] = mapped_column(String())  # Единица измерения (шт, кг и т.д.)
-    usd_price: Mapped[Optional[float]] = mapped_column(Float(), nullable=True)  # Цена в у.е. (Цена у.е.)
+    usd_price: Mapped[Optional[float]] = mapped_column(Float(), nullable=True, deferred=True, deferred_raiseload=True)  # Цена в у.е. (Цена у.е.)
     availability: Mapped[str] = mapped_column(String())  # Наличие (есть/нет)
     status: Mapped[Optional[str]] = mapped_column(String(), nullable=True)  # Статус товара
 
-    # Складские остатки
-    stock_chashnikovo: Mapped[Optional[str]] = mapped_column(String(), nullable=True)  # Москва, Чашниково
-    stock_kantemirovskaya: Mapped[Optional[str]] = mapped_column(String(), nullable=True)  # Москва, Кантемировская
-    stock_spb: Mapped[Optional[str]] = mapped_column(String(), nullable=True)  # Санкт-Петербург
-    stock_voronezh: Mapped[Optional[str]] = mapped_column(String(), nullable=True)  # Воронеж
-    stock_korolev: Mapped[Optional[str]] = mapped_column(String(), nullable=True)  # Королёв
-    stock_krasnodar: Mapped[Optional[str]] = mapped_column(String(), nullable=True)  # Краснодар
-    stock_kazan: Mapped[Optional[str]] = mapped_column(String(), nullable=True)  # Казань
-    stock_online: Mapped[Optional[str]] = mapped_column(String(), nullable=True)  # Интернет-магазин
-
     # Цены для Беларуси
-    price_byn_legal: Mapped[Optional[float]] = mapped_column(Float(), nullable=True)  # Цена для ЮЛ (Бел. BYN)
-    price_byn_retail: Mapped[Optional[float]] = mapped_column(Float(), nullable=True)  # Цена для ФЛ (Бел. BYN)
+    price_byn_legal: Mapped[Optional[float]] = mapped_column(Float(), nullable=True, deferred=True, deferred_raiseload=True)  # Цена для ЮЛ (Бел. BYN)
+    price_byn_retail: Mapped[Optional[float]] = mapped_column(Float(), nullable=True, deferred=True, deferred_raiseload=True)  # Цена для ФЛ (Бел. BYN)
+
+    # Отслеживание изменений (для инкрементальной синхронизации поиска)
+    updated_date: Mapped[datetime.datetime] = mapped_column(
+        DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now, index=True)  # Время последнего изменения
+    removed_date: Mapped[Optional[datetime.datetime]] = mapped_column(
+        DateTime, nullable=True)  # Время снятия с продажи (None - товар активен)
+    row_hash: Mapped[Optional[str]] = mapped_column(String(32), nullable=True)  # Хэш строки импорта (поиск изменений)
 
     favorites: Mapped[List["Favorite"]] = relationship(back_populates="product")
     cart_items: Mapped[list["CartItem"]] = relationship(back_populates="product")
     order_items: Mapped[list["OrderItems"]] = relationship(back_populates="product")
 
 
+class Warehouse(Base):
+    """Supplier warehouse (see core/stock.py for the fixed list)"""
+    __tablename__ = 'warehouses'
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    code: Mapped[str] = mapped_column(String(), unique=True)  # Код склада для API (например, "kazan")
+    name: Mapped[str] = mapped_column(String())  # Название склада
+
+
+class ProductStock(Base):
+    """Product quantity per warehouse (only positive quantities are stored)"""
+    __tablename__ = 'product_stock'
+    __table_args__ = (
+        PrimaryKeyConstraint('product_id', 'warehouse_id'),
+        # "In stock at warehouse X" lookups
+        Index('ix_product_stock_warehouse_product', 'warehouse_id', 'product_id'),
+    )
+
+    product_id: Mapped[int] = mapped_column(ForeignKey('products.id'))
+    warehouse_id: Mapped[int] = mapped_column(ForeignKey('warehouses.id'))
+    quantity: Mapped[int] = mapped_column(Integer)
+
+
 class Orders(Base):
     """User orders"""
     __tablename__ = 'orders'
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.telegram_id'))
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.telegram_id'), index=True)
     total_sum: Mapped[float] = mapped_column(Float)  # общая сумма заказа
     status: Mapped[str] = mapped_column(String(50), default="processing")
     delivery_method: Mapped[str] = mapped_column(String(100), nullable=True)
@@ -102,7 +131,7 @@ class OrderItems(Base):
     __tablename__ = 'order_items'
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    order_id: Mapped[int] = mapped_column(Integer, ForeignKey('orders.id'))
+    order_id: Mapped[int] = mapped_column(Integer, ForeignKey('orders.id'), index=True)
     product_id: Mapped[int] = mapped_column(Integer, ForeignKey('products.id'))
     quantity: Mapped[int] = mapped_column(Integer)
     price: Mapped[float] = mapped_column(Float)  # цена товара на момент заказа
@@ -127,6 +156,16 @@ class User(Base):
     cart_items: Mapped[list["CartItem"]] = relationship(back_populates="user")
 
 
+class CatalogMeta(Base):
+    """Catalog-wide markers (data version, sync points)"""
+    __tablename__ = 'catalog_meta'
+
+    key: Mapped[str] = mapped_column(String(), primary_key=True)
+    value: Mapped[str] = mapped_column(String())
+    updated_date: Mapped[datetime.datetime] = mapped_column(
+        DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now)
+
+
 class Reviews(Base):
     """User reviews and feedback"""
     __tablename__ = 'reviews'
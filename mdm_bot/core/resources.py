@@ -0,0 +1,36 @@
+"""
+CPU and memory available to this process (container limits included)
+"""
+import os
+from pathlib import Path
+from typing import Optional
+
+# cgroup v2 limit files (inside a container they describe the container)
+CGROUP_CPU_MAX = Path("/sys/fs/cgroup/cpu.max")
+CGROUP_MEMORY_MAX = Path("/sys/fs/cgroup/memory.max")
+
+
+def available_cpus() -> int:
+    """CPUs this process may use: affinity mask capped by the cgroup CPU quota"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        # Not available on macOS
+        cpus = os.cpu_count() or 1
+
+    try:
+        quota, period = CGROUP_CPU_MAX.read_text().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, int(quota) // int(period)))
+    except (OSError, ValueError):
+        pass
+    return max(1, cpus)
+
+
+def memory_limit() -> Optional[int]:
+    """Memory limit of the container in bytes (None when unlimited or unknown)"""
+    try:
+        value = CGROUP_MEMORY_MAX.read_text().strip()
+        return None if value == "max" else int(value)
+    except (OSError, ValueError):
+        return None
@@ -1,170 +1,474 @@
+import asyncio
+import datetime
 import logging
-from typing import List, Optional
-import meilisearch
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+import httpx
+from .cache import TTLCache
+from .catalog import (
+    SEARCH_DOCUMENT_VERSION_KEY,
+    SEARCH_SYNC_POINT_KEY,
+    get_catalog_meta,
+    set_catalog_meta,
+)
 from .config import settings
 from .database import AsyncSessionFactory
-from .models import Product
-from sqlalchemy import select
+from .models import Product, ProductStock, Warehouse
+from sqlalchemy import select, func
 
 logger = logging.getLogger(__name__)
 
 
+# Columns stored in Meilisearch documents
+SEARCH_DOCUMENT_COLUMNS = (
+    Product.id,
+    Product.name,
+    Product.vendor_code,
+    Product.price,
+    Product.vendor,
+    Product.model,
+    Product.description,
+    Product.availability,
+    Product.is_bestseller,
+    Product.image,
+    # Codes of warehouses that have the product in stock
+    select(func.array_agg(Warehouse.code))
+    .join(ProductStock, ProductStock.warehouse_id == Warehouse.id)
+    .where(ProductStock.product_id == Product.id)
+    .correlate(Product)
+    .scalar_subquery()
+    .label("warehouses"),
+)
+
+# Bump when document fields change: the next sync then re-sends the whole catalog
+SEARCH_DOCUMENT_VERSION = "3"
+
+# Attributes usable in filters, facet counts are returned for SEARCH_FACETS
+SEARCH_FILTERABLE_ATTRIBUTES = ['price', 'availability', 'vendor', 'is_bestseller', 'in_stock', 'warehouses']
+SEARCH_FACETS = ['vendor', 'is_bestseller', 'in_stock', 'warehouses', 'price']
+
+
+# Cached /api/search responses. Readers key them by the search sync marker, so a
+# sync done by another process (the importer) retires them without clearing here
+search_cache = TTLCache(
+    max_entries=settings.SEARCH_CACHE_MAX_ENTRIES,
+    ttl=settings.SEARCH_CACHE_TTL,
+)
+
+
+def normalize_query(query: str) -> str:
+    """Normalize search query: case, whitespace and ё/е folding"""
+    return " ".join(query.casefold().replace("ё", "е").split())
+
+
+def product_document(product) -> Dict[str, Any]:
+    """Build Meilisearch document from product"""
+    return {
+        'id': product.id,
+        'name': product.name,
+        'vendor_code': product.vendor_code,
+        'price': float(product.price),
+        'vendor': product.vendor,
+        'model': product.model,
+        'description': product.description or '',
+        'availability': product.availability,
+        'is_bestseller': product.is_bestseller,
+        'image': product.image,
+        'in_stock': bool(product.warehouses),
+        'warehouses': product.warehouses or []
+    }
+
+
+class MeiliSearchTaskError(Exception):
+    """Meilisearch task finished with failure or did not finish in time"""
+
+
 class MeiliSearchClient:
-    """Client for Meilisearch integration"""
+    """Async client for Meilisearch integration"""
 
     def __init__(self):
-        """Initialize Meilisearch client"""
+        """Initialize pooled HTTP client for Meilisearch"""
         meili_url = f"http://{settings.MEILI_HOST}:{settings.MEILI_PORT}"
-        self.client = meilisearch.Client(
-            meili_url,
-            settings.MEILI_MASTER_KEY if settings.MEILI_MASTER_KEY else None
+        headers = {}
+        if settings.MEILI_MASTER_KEY:
+            headers["Authorization"] = f"Bearer {settings.MEILI_MASTER_KEY}"
+
+        # Keep-alive pool shared by all requests of this process
+        self.client = httpx.AsyncClient(
+            base_url=meili_url,
+            headers=headers,
+            timeout=settings.MEILI_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=settings.MEILI_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.MEILI_MAX_KEEPALIVE_CONNECTIONS,
+            ),
         )
         self.index_name = "products"
-        self.index = None
+        self.index_ready = False
+        # Failed initialization is retried by ensure_index() with exponential backoff
+        self._init_lock = asyncio.Lock()
+        self._init_retry_at = 0.0
+        self._init_backoff = settings.MEILI_INIT_RETRY_INTERVAL
         logger.info(f"Meilisearch client initialized at {meili_url}")
 
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        timeout: Optional[float] = None,
+        **kwargs
+    ) -> Any:
+        """Send request to Meilisearch and return decoded JSON body"""
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        response = await self.client.request(method, path, **kwargs)
+        response.raise_for_status()
+        return response.json() if response.content else None
+
     async def init_index(self):
         """Initialize and configure the products index"""
         try:
-            # Create or get index
-            self.index = self.client.index(self.index_name)
-
-            # Configure searchable attributes (fields to search in)
-            self.index.update_searchable_attributes([
-                'name',
-                'description',
-                'vendor',
-                'vendor_code',
-                'model'
-            ])
-
-            # Configure filterable attributes (for filtering results)
-            self.index.update_filterable_attributes([
-                'price',
-                'availability',
-                'vendor',
-                'is_bestseller'
-            ])
-
-            # Configure sortable attributes
-            self.index.update_sortable_attributes([
-                'price'
-            ])
-
-            # Configure typo tolerance (enabled by default, but we ensure it's on)
-            self.index.update_typo_tolerance({
-                'enabled': True,
-                'minWordSizeForTypos': {
-                    'oneTypo': 5,
-                    'twoTypos': 9
+            # Create index (Meilisearch answers with a failed task if it already exists)
+            await self._request("POST", "/indexes", json={
+                'uid': self.index_name,
+                'primaryKey': 'id'
+            })
+
+            # Apply all index settings in a single task
+            task = await self._request("PATCH", f"/indexes/{self.index_name}/settings", json={
+                # Configure searchable attributes (fields to search in)
+                'searchableAttributes': [
+                    'name',
+                    'description',
+                    'vendor',
+                    'vendor_code',
+                    'model'
+                ],
+                # Configure filterable attributes (for filtering results and facets)
+                'filterableAttributes': SEARCH_FILTERABLE_ATTRIBUTES,
+                # Configure sortable attributes
+                'sortableAttributes': [
+                    'price',
+                    'id'
+                ],
+                # Let filtered catalog listing page through the whole catalog (default is 1000)
+                'pagination': {
+                    'maxTotalHits': settings.SEARCH_MAX_TOTAL_HITS
+                },
+                # Configure typo tolerance (enabled by default, but we ensure it's on)
+                'typoTolerance': {
+                    'enabled': True,
+                    'minWordSizeForTypos': {
+                        'oneTypo': 5,
+                        'twoTypos': 9
+                    }
                 }
             })
+            # Searches sorted or filtered before the settings apply would be rejected
+            await self.wait_for_task(task['taskUid'], timeout_in_ms=settings.MEILI_TASK_TIMEOUT * 1000)
 
+            self.index_ready = True
             logger.info(f"Index '{self.index_name}' configured successfully")
 
         except Exception as e:
             logger.error(f"Error initializing index: {e}")
             raise
 
-    async def sync_products(self):
-        """Sync all products from PostgreSQL to Meilisearch"""
+    async def ensure_index(self):
+        """
+        Initialize the index unless it is ready, at most once per backoff interval
+
+        Raises:
+            MeiliSearchTaskError while the index can't be initialized
+        """
+        if self.index_ready:
+            return
+        # Requests arriving during an attempt or before the next one fail fast
+        if self._init_lock.locked() or time.monotonic() < self._init_retry_at:
+            raise MeiliSearchTaskError("Index not initialized")
+
+        async with self._init_lock:
+            try:
+                await self.init_index()
+            except Exception as e:
+                self._init_retry_at = time.monotonic() + self._init_backoff
+                logger.warning(f"Index initialization failed, next attempt in {self._init_backoff:.0f}s")
+                self._init_backoff = min(self._init_backoff * 2, settings.MEILI_INIT_RETRY_MAX_INTERVAL)
+                raise MeiliSearchTaskError(f"Index not initialized: {e}")
+            self._init_backoff = settings.MEILI_INIT_RETRY_INTERVAL
+
+    async def add_documents(self, documents: List[Dict[str, Any]], timeout: Optional[float] = None) -> int:
+        """
+        Enqueue documents for indexing
+
+        Returns:
+            Meilisearch task UID
+        """
+        task = await self._request(
+            "POST",
+            f"/indexes/{self.index_name}/documents",
+            params={'primaryKey': 'id'},
+            json=documents,
+            timeout=timeout
+        )
+        return task['taskUid']
+
+    async def wait_for_task(
+        self,
+        task_uid: int,
+        timeout_in_ms: int = 5000,
+        interval_in_ms: int = 50
+    ) -> Dict[str, Any]:
+        """Poll task status until it is finished without blocking the event loop"""
+        deadline = time.monotonic() + timeout_in_ms / 1000
+        while True:
+            task = await self._request("GET", f"/tasks/{task_uid}")
+            if task['status'] == 'succeeded':
+                return task
+            if task['status'] in ('failed', 'canceled'):
+                raise MeiliSearchTaskError(f"Task {task_uid} {task['status']}: {task.get('error')}")
+            if time.monotonic() >= deadline:
+                raise MeiliSearchTaskError(f"Task {task_uid} did not finish in {timeout_in_ms} ms")
+            await asyncio.sleep(interval_in_ms / 1000)
+
+    async def delete_documents(self, product_ids: List[int], timeout: Optional[float] = None) -> int:
+        """
+        Enqueue documents deletion
+
+        Returns:
+            Meilisearch task UID
+        """
+        task = await self._request(
+            "POST",
+            f"/indexes/{self.index_name}/documents/delete-batch",
+            json=product_ids,
+            timeout=timeout
+        )
+        return task['taskUid']
+
+    async def get_document_count(self) -> int:
+        """Return number of documents in the index"""
+        stats = await self._request("GET", f"/indexes/{self.index_name}/stats")
+        return stats['numberOfDocuments']
+
+    async def _wait_for_tasks(self, pending: Deque[int], keep: int):
+        """Wait for the oldest enqueued tasks until at most `keep` remain in flight"""
+        while len(pending) > max(keep, 0):
+            await self.wait_for_task(pending.popleft(), timeout_in_ms=settings.MEILI_TASK_TIMEOUT * 1000)
+
+    async def sync_products(self, full: bool = False):
+        """
+        Sync products from PostgreSQL to Meilisearch
+
+        Only products changed or removed since the last recorded sync point are
+        pushed. Rows are streamed in MEILI_SYNC_BATCH_SIZE batches with up to
+        MEILI_SYNC_MAX_IN_FLIGHT indexing tasks enqueued at once, so memory use
+        doesn't depend on catalog size. A full resync is done when there is no
+        sync point yet, when the index is empty (e.g. fresh Meilisearch volume)
+        or when full=True.
+
+        Args:
+            full: Push the whole catalog regardless of the sync point
+        """
         try:
             logger.info("Starting product synchronization...")
 
-            # Fetch all products from database
+            if not self.index_ready:
+                await self.init_index()
+
+            # Taken before reading, so changes made during the sync are picked up next time
+            started_at = datetime.datetime.now()
+
             async with AsyncSessionFactory() as session:
-                stmt = select(Product)
-                result = await session.execute(stmt)
-                products = result.scalars().all()
-
-            if not products:
-                logger.warning("No products found in database")
-                return
-
-            # Prepare documents for Meilisearch
-            documents = []
-            for product in products:
-                doc = {
-                    'id': product.id,
-                    'name': product.name,
-                    'vendor_code': product.vendor_code,
-                    'price': float(product.price),
-                    'vendor': product.vendor,
-                    'model': product.model,
-                    'description': product.description or '',
-                    'availability': product.availability,
-                    'is_bestseller': product.is_bestseller
-                }
-                documents.append(doc)
+                since = None
+                document_version = await get_catalog_meta(session, SEARCH_DOCUMENT_VERSION_KEY)
+                if not full and document_version == SEARCH_DOCUMENT_VERSION:
+                    sync_point = await get_catalog_meta(session, SEARCH_SYNC_POINT_KEY)
+                    if sync_point and await self.get_document_count() > 0:
+                        # Overlap covers transactions that committed after the previous sync read
+                        since = (datetime.datetime.fromisoformat(sync_point)
+                                 - datetime.timedelta(seconds=settings.MEILI_SYNC_OVERLAP))
 
-            # Add documents to Meilisearch
-            if self.index is None:
-                await self.init_index()
+                stmt = select(*SEARCH_DOCUMENT_COLUMNS).where(Product.removed_date.is_(None))
+                removed_stmt = select(Product.id).where(Product.removed_date.is_not(None))
+                if since is not None:
+                    stmt = stmt.where(Product.updated_date > since)
+                    removed_stmt = removed_stmt.where(Product.removed_date > since)
+
+                total = (await session.execute(
+                    select(func.count()).select_from(stmt.subquery()))).scalar()
+                mode = "full" if since is None else f"delta since {since.isoformat()}"
+                logger.info(f"Sync mode: {mode}, products to index: {total}")
+
+                batch_size = settings.MEILI_SYNC_BATCH_SIZE
+                pending = deque()
+                indexed = removed = 0
+
+                # Stream rows through a server-side cursor, one batch in memory at a time
+                result = await session.stream(stmt.execution_options(yield_per=batch_size))
+                async for rows in result.partitions():
+                    pending.append(await self.add_documents([product_document(row) for row in rows]))
+                    indexed += len(rows)
+                    logger.info(f"Sync progress: {indexed}/{total} products queued")
+                    await self._wait_for_tasks(pending, keep=settings.MEILI_SYNC_MAX_IN_FLIGHT - 1)
+
+                result = await session.stream(removed_stmt.execution_options(yield_per=batch_size))
+                async for rows in result.partitions():
+                    pending.append(await self.delete_documents([row.id for row in rows]))
+                    removed += len(rows)
+                    await self._wait_for_tasks(pending, keep=settings.MEILI_SYNC_MAX_IN_FLIGHT - 1)
 
-            task = self.index.add_documents(documents)
-            logger.info(f"Synced {len(documents)} products to Meilisearch. Task UID: {task.task_uid}")
+            # Wait for the remaining tasks to complete
+            await self._wait_for_tasks(pending, keep=0)
 
-            # Wait for the task to complete
-            self.client.wait_for_task(task.task_uid)
-            logger.info("Product synchronization completed successfully")
+            # Record sync point only after Meilisearch accepted all changes
+            async with AsyncSessionFactory() as session:
+                await set_catalog_meta(session, SEARCH_SYNC_POINT_KEY, started_at.isoformat())
+                await set_catalog_meta(session, SEARCH_DOCUMENT_VERSION_KEY, SEARCH_DOCUMENT_VERSION)
+                await session.commit()
+
+            logger.info(f"Product synchronization completed successfully "
+                        f"(indexed: {indexed}, removed: {removed})")
 
         except Exception as e:
             logger.error(f"Error syncing products: {e}")
             raise
 
-    def search_products(self, query: str, limit: int = 5) -> List[int]:
+    async def search(
+        self,
+        query: str,
+        attributes: Optional[List[str]] = None,
+        filter: Optional[List[Any]] = None,
+        sort: Optional[List[str]] = None,
+        facets: Optional[List[str]] = None,
+        limit: Optional[int] = None,
+        page: Optional[int] = None,
+        hits_per_page: Optional[int] = None,
+        timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
         """
-        Search products and return list of product IDs
+        Run search request and return the raw Meilisearch response
+
+        Args:
+            query: Search query string (empty string lists all matching documents)
+            attributes: Document fields to return (all stored fields by default)
+            filter: Meilisearch filter expression (list items are ANDed)
+            sort: Sort rules, e.g. ['price:asc']
+            facets: Attributes to return facet distribution and stats for
+            limit: Maximum number of results (offset-less mode)
+            page, hits_per_page: Page mode with exact totalHits/totalPages
+            timeout: Request timeout in seconds (MEILI_SEARCH_TIMEOUT by default)
+
+        Raises:
+            Exception if the index can't be initialized or the request fails
+        """
+        await self.ensure_index()
+
+        body: Dict[str, Any] = {
+            'q': query,
+            'attributesToRetrieve': attributes or ['*']
+        }
+        if filter:
+            body['filter'] = filter
+        if sort:
+            body['sort'] = sort
+        if facets:
+            body['facets'] = facets
+        if page is not None:
+            body['page'] = page
+            body['hitsPerPage'] = hits_per_page
+        elif limit is not None:
+            body['limit'] = limit
+
+        return await self._request(
+            "POST",
+            f"/indexes/{self.index_name}/search",
+            json=body,
+            timeout=timeout or settings.MEILI_SEARCH_TIMEOUT
+        )
+
+    async def search_documents(
+        self,
+        query: str,
+        limit: int = 5,
+        attributes: Optional[List[str]] = None,
+        timeout: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Search products and return matching documents
 
         Args:
             query: Search query string
             limit: Maximum number of results
+            attributes: Document fields to return (all stored fields by default)
+            timeout: Request timeout in seconds (MEILI_SEARCH_TIMEOUT by default)
 
         Returns:
-            List of product IDs
+            List of documents in relevance order
         """
         try:
-            if self.index is None:
-                logger.error("Index not initialized")
-                return []
-
-            # Perform search
-            results = self.index.search(
-                query,
-                {
-                    'limit': limit,
-                    'attributesToRetrieve': ['id']
-                }
-            )
+            results = await self.search(query, attributes=attributes, limit=limit, timeout=timeout)
 
-            # Extract product IDs
-            product_ids = [hit['id'] for hit in results['hits']]
-            logger.info(f"Search query '{query}' returned {len(product_ids)} results")
+            hits = results['hits']
+            logger.info(f"Search query '{query}' returned {len(hits)} results")
 
-            return product_ids
+            return hits
 
         except Exception as e:
             logger.error(f"Error searching products: {e}")
             return []
 
-    async def health_check(self) -> bool:
+    async def search_products(self, query: str, limit: int = 5, timeout: Optional[float] = None) -> List[int]:
+        """
+        Search products and return list of product IDs
+
+        Args:
+            query: Search query string
+            limit: Maximum number of results
+            timeout: Request timeout in seconds (MEILI_SEARCH_TIMEOUT by default)
+
+        Returns:
+            List of product IDs
+        """
+        hits = await self.search_documents(query, limit=limit, attributes=['id'], timeout=timeout)
+        return [hit['id'] for hit in hits]
+
+    async def health_check(self, timeout: Optional[float] = None) -> bool:
         """Check if Meilisearch is healthy"""
         try:
-            health = self.client.health()
+            health = await self._request("GET", "/health", timeout=timeout)
             return health.get('status') == 'available'
         except Exception as e:
             logger.error(f"Meilisearch health check failed: {e}")
             return False
 
+    async def close(self):
+        """Close pooled HTTP connections"""
+        await self.client.aclose()
+
 
 # Global instance
 meili_client: Optional[MeiliSearchClient] = None
 
 
 async def get_meili_client() -> MeiliSearchClient:
-    """Get or create global Meilisearch client instance"""
+    """
+    Get or create global Meilisearch client instance
+
+    Raises:
+        MeiliSearchTaskError while the index can't be initialized (retried on later calls)
+    """
     global meili_client
     if meili_client is None:
         meili_client = MeiliSearchClient()
-        await meili_client.init_index()
+    await meili_client.ensure_index()
     return meili_client
+
+
+async def close_meili_client():
+    """Close global Meilisearch client"""
+    global meili_client
+    if meili_client is not None:
+        await meili_client.close()
+        meili_client = None
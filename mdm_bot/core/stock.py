@@ -0,0 +1,48 @@
+"""
+Warehouse dictionary and stock quantity parsing
+"""
+import re
+from typing import List, NamedTuple, Optional
+
+
+class WarehouseInfo(NamedTuple):
+    """Warehouse known to the supplier feed"""
+    id: int
+    code: str
+    name: str
+    csv_column: str
+
+
+# IDs are stored in product_stock, never renumber them
+WAREHOUSES: List[WarehouseInfo] = [
+    WarehouseInfo(1, "chashnikovo", "Москва, Чашниково", "Количество на складе «Москва, Чашниково»"),
+    WarehouseInfo(2, "kantemirovskaya", "Москва, Кантемировская", "Количество на складе «Москва, Кантемировская»"),
+    WarehouseInfo(3, "spb", "Санкт-Петербург", "Количество на складе «Санкт-Петербург»"),
+    WarehouseInfo(4, "voronezh", "Воронеж", "Количество на складе «Воронеж»"),
+    WarehouseInfo(5, "korolev", "Королёв", "Количество на складе «Королёв»"),
+    WarehouseInfo(6, "krasnodar", "Краснодар", "Количество на складе «Краснодар»"),
+    WarehouseInfo(7, "kazan", "Казань", "Количество на складе «Казань»"),
+    WarehouseInfo(8, "online", "Интернет-магазин", "Количество на складе «Интернет-магазин»"),
+]
+
+WAREHOUSES_BY_CODE = {warehouse.code: warehouse for warehouse in WAREHOUSES}
+
+# Values meaning "nothing in stock"
+EMPTY_STOCK_VALUES = ("", "-", "нет", "0")
+
+_QUANTITY_RE = re.compile(r"\d+")
+
+
+def parse_stock_quantity(value: Optional[str]) -> int:
+    """
+    Convert feed stock value to a number of units
+
+    The feed mixes plain numbers with values like ">10" or "много": the first
+    number found is used, and non-empty text without a number counts as 1
+    (in stock, quantity unknown).
+    """
+    value = (value or "").strip().lower()
+    match = _QUANTITY_RE.search(value)
+    if match:
+        return int(match.group())
+    return 0 if value in EMPTY_STOCK_VALUES else 1
@@ -0,0 +1,118 @@
+"""
+User registration with batched write-behind
+"""
+import asyncio
+import logging
+from typing import Dict, Iterable, Optional
+from sqlalchemy.dialects.postgresql import insert
+
+from .config import settings
+from .database import AsyncSessionFactory
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+
+async def upsert_users(session, users: Iterable[dict]):
+    """
+    Register users or refresh their usernames in a single statement (caller commits)
+
+    Args:
+        users: Dicts with telegram_id, username and name
+    """
+    rows = [
+        dict(telegram_id=user["telegram_id"], username=user["username"],
+             name=user["name"] or "", phone_number="", address="")
+        for user in users
+    ]
+    if not rows:
+        return
+
+    stmt = insert(User).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[User.telegram_id],
+        set_={"username": stmt.excluded.username},
+        # Skip the write (and the dead tuple) when nothing changed
+        where=User.username.is_distinct_from(stmt.excluded.username),
+    )
+    await session.execute(stmt)
+
+
+class UserWriteBehind:
+    """
+    Queue of user registrations flushed to the database in batches.
+
+    Handlers enqueue and reply right away; a background task writes pending
+    users every `flush_interval` seconds (or sooner once `batch_size` users are
+    waiting) with one upsert per batch. Repeated /start of the same user
+    before a flush collapses into one row. A batch leaves the queue only
+    after its commit; a failed or cancelled write puts it back.
+    """
+
+    def __init__(self, flush_interval: float, batch_size: int):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._pending: Dict[int, dict] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def enqueue(self, telegram_id: int, username: Optional[str], name: Optional[str]):
+        """Schedule user registration or username refresh"""
+        self._pending[telegram_id] = dict(telegram_id=telegram_id, username=username, name=name)
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def flush(self):
+        """Write all pending users"""
+        while self._pending:
+            batch = dict(list(self._pending.items())[:self.batch_size])
+            for telegram_id in batch:
+                del self._pending[telegram_id]
+
+            try:
+                async with AsyncSessionFactory() as session:
+                    await upsert_users(session, batch.values())
+                    await session.commit()
+            except BaseException:
+                # Put the batch back (also when cancelled mid-upsert) unless newer
+                # data for the user arrived meanwhile
+                for telegram_id, user in batch.items():
+                    self._pending.setdefault(telegram_id, user)
+                raise
+            logger.info(f"Registered/refreshed {len(batch)} users")
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing users: {e}")
+
+    def start(self):
+        """Start background flushing"""
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop background flushing and write what is left"""
+        if self._task is not None:
+            # Not cancelled: a flush in progress finishes its upsert first
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+
+user_write_behind = UserWriteBehind(
+    flush_interval=settings.USER_WRITE_BEHIND_INTERVAL,
+    batch_size=settings.USER_WRITE_BEHIND_BATCH_SIZE,
+)
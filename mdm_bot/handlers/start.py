@@ -2,9 +2,9 @@ import logging
 from aiogram import Router
 from aiogram.filters import CommandStart
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
-from sqlalchemy import select
 
-from mdm_bot.core import AsyncSessionFactory, User, settings
+from mdm_bot.core import settings
+from mdm_bot.core.users import user_write_behind
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -14,38 +14,16 @@ router = Router()
 async def command_start_handler(message: Message) -> None:
     """
     Handler for /start command.
-    Creates or updates user in database and sends Mini App link.
+    Schedules user registration (or username refresh) and sends Mini App link.
     """
     user_id = message.from_user.id
     username = message.from_user.username
     full_name = message.from_user.full_name
 
-    async with AsyncSessionFactory() as session:
-        logger.info(f"User {user_id} started the bot")
+    logger.info(f"User {user_id} started the bot")
 
-        # Check if user exists
-        stmt = select(User).where(User.telegram_id == user_id)
-        result = await session.execute(stmt)
-        user = result.scalar_one_or_none()
-
-        if user is None:
-            # Create new user
-            user = User(
-                telegram_id=user_id,
-                username=username,
-                name=full_name or "",
-                phone_number="",
-                address=""
-            )
-            session.add(user)
-            await session.commit()
-            logger.info(f"New user {user_id} created")
-        else:
-            # Update username if changed
-            if user.username != username:
-                user.username = username
-                await session.commit()
-            logger.info(f"Existing user {user_id} returned")
+    # Registered by the background flush, the reply doesn't wait for the database
+    user_write_behind.enqueue(user_id, username, full_name)
 
     # Create Mini App button
     webapp_button = InlineKeyboardButton(
@@ -0,0 +1,8 @@
+"""
+Bot middlewares: update concurrency and outbound rate limiting
+"""
+
+from .concurrency import ConcurrencyMiddleware
+from .rate_limit import SendRateLimitMiddleware
+
+__all__ = ["ConcurrencyMiddleware", "SendRateLimitMiddleware"]
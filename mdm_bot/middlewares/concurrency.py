@@ -0,0 +1,77 @@
+"""
+Bounded concurrent update processing with per-chat ordering
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+
+class ConcurrencyMiddleware(BaseMiddleware):
+    """
+    Outer update middleware limiting how many updates are handled at once.
+
+    Updates of one chat are handled one at a time in arrival order (FIFO
+    per-chat lock), different chats run concurrently up to `limit`. A chat
+    waiting for its previous update doesn't occupy a global slot.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._semaphore = asyncio.Semaphore(limit)
+        # chat_id -> [lock, number of updates holding or waiting for it]
+        self._chat_locks: Dict[int, list] = {}
+        self.in_flight = 0  # Updates inside the middleware (waiting or handled)
+        self.active = 0  # Updates being handled
+        self.handled = 0
+
+    def _acquire_chat_lock(self, chat_id: int) -> asyncio.Lock:
+        entry = self._chat_locks.setdefault(chat_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        return entry[0]
+
+    def _release_chat_lock(self, chat_id: int):
+        entry = self._chat_locks[chat_id]
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self._chat_locks[chat_id]
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        chat = data.get("event_chat")
+        self.in_flight += 1
+        try:
+            if chat is None:
+                return await self._handle(handler, event, data)
+
+            lock = self._acquire_chat_lock(chat.id)
+            try:
+                async with lock:
+                    return await self._handle(handler, event, data)
+            finally:
+                self._release_chat_lock(chat.id)
+        finally:
+            self.in_flight -= 1
+
+    async def _handle(self, handler, event, data):
+        async with self._semaphore:
+            self.active += 1
+            try:
+                return await handler(event, data)
+            finally:
+                self.active -= 1
+                self.handled += 1
+
+    def stats(self) -> dict:
+        """Update processing statistics for monitoring"""
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "waiting": self.in_flight - self.active,
+            "chats": len(self._chat_locks),
+            "handled": self.handled,
+        }
@@ -0,0 +1,116 @@
+"""
+Outbound Telegram request rate limiting
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+
+logger = logging.getLogger(__name__)
+
+
+class SendRateLimitMiddleware(BaseRequestMiddleware):
+    """
+    Bot session middleware spacing out requests that target a chat.
+
+    Every request with a chat_id waits for a send slot allowed by the per-chat
+    budget (one request per `chat_interval` seconds) and the global budget
+    (`rate` requests per second). Waiting requests
+    form the send queue. When Telegram still answers with RetryAfter, the
+    chat is paused for the requested time and the request is retried up to
+    `max_retries` times. Requests without a chat (callback answers, getMe,
+    webhook setup) pass through.
+    """
+
+    def __init__(self, rate: float, chat_interval: float, max_retries: int):
+        self.rate = rate
+        self.chat_interval = chat_interval
+        self.max_retries = max_retries
+        self._next_slot = 0.0
+        self._next_chat_slot: Dict[int, float] = {}
+        self.queued = 0
+        self.max_queued = 0
+        self.sent = 0
+        self.retries = 0
+
+    def _reserve_chat_slot(self, chat_id) -> float:
+        """Reserve the chat's next send slot and return seconds to wait for it"""
+        now = time.monotonic()
+        slot = max(now, self._next_chat_slot.get(chat_id, 0.0))
+        self._next_chat_slot[chat_id] = slot + self.chat_interval
+
+        # Forget chats whose budget is already restored
+        if len(self._next_chat_slot) > 10000:
+            self._next_chat_slot = {
+                chat: next_slot for chat, next_slot in self._next_chat_slot.items() if next_slot > now
+            }
+        return slot - now
+
+    def _reserve_global_slot(self) -> float:
+        """Reserve the next global send slot and return seconds to wait for it"""
+        now = time.monotonic()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + 1 / self.rate
+        return slot - now
+
+    async def _wait_for_slot(self, chat_id):
+        """
+        Wait for the chat budget, then for the global one
+
+        The global slot is reserved only once the chat may send, so a paused
+        chat doesn't hold back the others.
+        """
+        self.queued += 1
+        self.max_queued = max(self.max_queued, self.queued)
+        try:
+            delay = self._reserve_chat_slot(chat_id)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            delay = self._reserve_global_slot()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        finally:
+            self.queued -= 1
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        chat_id: Optional[int] = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return await make_request(bot, method)
+
+        attempt = 0
+        while True:
+            await self._wait_for_slot(chat_id)
+            try:
+                response = await make_request(bot, method)
+                self.sent += 1
+                return response
+            except TelegramRetryAfter as e:
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                self.retries += 1
+                logger.warning(f"Flood control for chat {chat_id}: retry in {e.retry_after} s "
+                               f"(attempt {attempt}/{self.max_retries})")
+                # Following requests to this chat queue up behind the pause
+                self._next_chat_slot[chat_id] = max(
+                    self._next_chat_slot.get(chat_id, 0.0), time.monotonic() + e.retry_after)
+
+    def stats(self) -> dict:
+        """Send queue statistics for monitoring"""
+        return {
+            "rate": self.rate,
+            "chat_interval": self.chat_interval,
+            "queued": self.queued,
+            "max_queued": self.max_queued,
+            "sent": self.sent,
+            "retries": self.retries,
+        }
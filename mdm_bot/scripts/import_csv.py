@@ -1,9 +1,20 @@
 """
 CSV import script for products database
 """
+import argparse
 import csv
 import asyncio
-from mdm_bot.core import Product, AsyncSessionFactory, create_tables
+import datetime
+import hashlib
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy import select
+from mdm_bot.core import Product, ProductStock, create_tables, bump_catalog_version, settings
+from mdm_bot.core.database import async_engine
+from mdm_bot.core.resources import available_cpus
+from mdm_bot.core.stock import WAREHOUSES, parse_stock_quantity
+from mdm_bot.core.search import get_meili_client, close_meili_client
 
 
 def convert_to_bool(value):
@@ -33,82 +44,396 @@ def check_if_bestseller(value):
     return bool(value and value.strip())
 
 
-async def process_csv(file_path):
-    """Process CSV file and populate database"""
+# Product columns loaded by COPY, in record order
+PRODUCT_COPY_COLUMNS = [
+    'id', 'url', 'name', 'vendor_code', 'price', 'currency_id', 'category_id', 'model',
+    'vendor', 'description', 'manufacturer_warranty', 'image', 'opt_price',
+    'is_bestseller', 'unit', 'usd_price', 'availability', 'status', 'price_byn_legal',
+    'price_byn_retail', 'row_hash', 'created_date', 'updated_date',
+]
+
+# Product stock columns loaded by COPY, in record order
+STOCK_COPY_COLUMNS = ['product_id', 'warehouse_id', 'quantity']
+
+# Values that come from the CSV and take part in change detection
+HASHED_COLUMNS = [
+    column for column in PRODUCT_COPY_COLUMNS
+    if column not in ('id', 'row_hash', 'created_date', 'updated_date')
+] + ['stock']
+
+DEFAULT_BATCH_SIZE = 5000
+# CPUs the container may use, not the host's core count
+DEFAULT_WORKERS = max(1, min(available_cpus(), settings.IMPORT_MAX_WORKERS))
+
+
+def convert_stock(row):
+    """Convert stock columns into [(warehouse_id, quantity)] for warehouses that have the product"""
+    stock = []
+    for warehouse in WAREHOUSES:
+        quantity = parse_stock_quantity(row.get(warehouse.csv_column, ''))
+        if quantity > 0:
+            stock.append((warehouse.id, quantity))
+    return stock
+
+
+def convert_row(row):
+    """Convert CSV row into product column values"""
+    # Convert price from string to float
+    price = float(row.get('price', 0).replace(',', '.'))
+
+    # Convert wholesale price
+    opt_price_str = row.get('Цена ОПТ, RUR', '')
+    opt_price = float(opt_price_str.replace(',', '.')) if opt_price_str else None
+
+    # Convert USD price
+    usd_price_str = row.get('Цена у.е.', '')
+    usd_price = float(usd_price_str.replace(',', '.')) if usd_price_str else None
+
+    # Convert Belarus prices
+    price_byn_legal_str = row.get('Цена для ЮЛ (Бел. BYN.): Цена', '')
+    price_byn_legal = float(price_byn_legal_str.replace(',', '.')) if price_byn_legal_str else None
+
+    price_byn_retail_str = row.get('Цена для ФЛ (Бел. BYN.): Цена', '')
+    price_byn_retail = float(price_byn_retail_str.replace(',', '.')) if price_byn_retail_str else None
+
+    # Get first image
+    image = extract_first_image(row.get('Pictures', ''))
+
+    return dict(
+        url=row.get('url', ''),
+        name=row.get('name', ''),
+        vendor_code=row.get('vendorCode', ''),
+        price=price,
+        currency_id=row.get('currencyId', 'RUR'),
+        category_id=int(row.get('categoryId', 0)),
+        model=row.get('model', ''),
+        vendor=row.get('vendor', ''),
+        description=row.get('description', ''),
+        manufacturer_warranty=convert_to_bool(row.get('manufacturer warranty', '')),
+        image=image,
+        opt_price=opt_price,
+        is_bestseller=check_if_bestseller(row.get('Хит продаж', '')),
+        unit=row.get('Единица измерения', 'шт'),
+        usd_price=usd_price,
+        availability=map_availability(row.get('Наличие', '')),
+        status=row.get('Статус товара', ''),
+        # Stock quantities
+        stock=convert_stock(row),
+        # Belarus prices
+        price_byn_legal=price_byn_legal,
+        price_byn_retail=price_byn_retail
+    )
+
+
+def iter_batches(rows, batch_size):
+    """Group rows into lists of batch_size"""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def compute_row_hash(values):
+    """Hash converted product values to detect changed rows"""
+    payload = "\x1f".join(repr(values[column]) for column in HASHED_COLUMNS)
+    return hashlib.md5(payload.encode('utf-8')).hexdigest()
+
+
+def convert_batch(header, raw_rows):
+    """
+    Convert raw CSV rows to product values with row hashes
+
+    Runs in worker processes, so it only takes and returns picklable data.
+    """
+    values_list = []
+    for raw_row in raw_rows:
+        values = convert_row(dict(zip(header, raw_row)))
+        values['row_hash'] = compute_row_hash(values)
+        values_list.append(values)
+    return values_list
+
+
+async def iter_converted_batches(file, batch_size, workers):
+    """
+    Read CSV file and yield converted batches in file order
+
+    The file is parsed in this process (quoted descriptions may span lines, so
+    it can't be split by byte offsets) and raw batches are converted in a pool
+    of `workers` processes. Up to two batches per worker are in flight, which
+    keeps every core busy while the caller writes the previous batch.
+    """
+    reader = csv.reader(file, delimiter=",")
+    header = next(reader, None)
+    if header is None:
+        return
+
+    if workers <= 1:
+        for raw_rows in iter_batches(reader, batch_size):
+            yield convert_batch(header, raw_rows)
+        return
+
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for raw_rows in iter_batches(reader, batch_size):
+            pending.append(loop.run_in_executor(pool, convert_batch, header, raw_rows))
+            if len(pending) >= workers * 2:
+                yield await pending.popleft()
+        while pending:
+            yield await pending.popleft()
+
+
+def to_record(values, columns):
+    """Build COPY record from product values"""
+    return tuple(values[column] for column in columns)
+
+
+async def copy_stock(driver_connection, values_list):
+    """Load stock quantities of products (IDs must be assigned)"""
+    records = [
+        (values['id'], warehouse_id, quantity)
+        for values in values_list
+        for warehouse_id, quantity in values['stock']
+    ]
+    if records:
+        await driver_connection.copy_records_to_table(
+            ProductStock.__tablename__,
+            records=records,
+            columns=STOCK_COPY_COLUMNS
+        )
+
+
+class ImportResult:
+    """Summary of an import run"""
+
+    def __init__(self):
+        self.inserted_ids = []
+        self.updated_ids = []
+        self.removed_ids = []
+        self.unchanged = 0
+        self.skipped = 0
+
+    @property
+    def changed_ids(self):
+        """IDs of all products whose search documents must be refreshed"""
+        return sorted(self.inserted_ids + self.updated_ids + self.removed_ids)
+
+
+async def allocate_product_ids(driver_connection, count):
+    """Reserve product IDs from the primary key sequence"""
+    rows = await driver_connection.fetch(
+        "SELECT nextval(pg_get_serial_sequence('products', 'id')) AS id "
+        "FROM generate_series(1, $1)",
+        count
+    )
+    return [row['id'] for row in rows]
+
+
+async def process_csv(file_path, batch_size=DEFAULT_BATCH_SIZE, upsert=False, workers=DEFAULT_WORKERS):
+    """
+    Process CSV file and populate database
+
+    The file is streamed and loaded with PostgreSQL COPY in batches of
+    batch_size rows, all in one transaction. Rows are converted in
+    `workers` processes while a single writer loads the batches.
+
+    With upsert=True products are matched by vendor_code: new ones are
+    inserted, rows whose hash differs are updated, unchanged rows are
+    skipped and products missing from the file are marked as removed.
+    """
+    started = time.monotonic()
+    result = ImportResult()
+
     with open(file_path, 'r', encoding='utf-8') as file:
-        reader = csv.DictReader(file, delimiter=",")
-
-        # Create database session
-        async with AsyncSessionFactory() as session:
-            for row in reader:
-                # Convert price from string to float
-                price = float(row.get('price', 0).replace(',', '.'))
-
-                # Convert wholesale price
-                opt_price_str = row.get('Цена ОПТ, RUR', '')
-                opt_price = float(opt_price_str.replace(',', '.')) if opt_price_str else None
-
-                # Convert USD price
-                usd_price_str = row.get('Цена у.е.', '')
-                usd_price = float(usd_price_str.replace(',', '.')) if usd_price_str else None
-
-                # Convert Belarus prices
-                price_byn_legal_str = row.get('Цена для ЮЛ (Бел. BYN.): Цена', '')
-                price_byn_legal = float(price_byn_legal_str.replace(',', '.')) if price_byn_legal_str else None
-
-                price_byn_retail_str = row.get('Цена для ФЛ (Бел. BYN.): Цена', '')
-                price_byn_retail = float(price_byn_retail_str.replace(',', '.')) if price_byn_retail_str else None
-
-                # Get first image
-                image = extract_first_image(row.get('Pictures', ''))
-
-                # Create product object
-                product = Product(
-                    url=row.get('url', ''),
-                    name=row.get('name', ''),
-                    vendor_code=row.get('vendorCode', ''),
-                    price=price,
-                    currency_id=row.get('currencyId', 'RUR'),
-                    category_id=int(row.get('categoryId', 0)),
-                    model=row.get('model', ''),
-                    vendor=row.get('vendor', ''),
-                    description=row.get('description', ''),
-                    manufacturer_warranty=convert_to_bool(row.get('manufacturer warranty', '')),
-                    image=image,
-                    opt_price=opt_price,
-                    is_bestseller=check_if_bestseller(row.get('Хит продаж', '')),
-                    unit=row.get('Единица измерения', 'шт'),
-                    usd_price=usd_price,
-                    availability=map_availability(row.get('Наличие', '')),
-                    status=row.get('Статус товара', ''),
-                    # Stock quantities
-                    stock_chashnikovo=row.get('Количество на складе «Москва, Чашниково»', ''),
-                    stock_kantemirovskaya=row.get('Количество на складе «Москва, Кантемировская»', ''),
-                    stock_spb=row.get('Количество на складе «Санкт-Петербург»', ''),
-                    stock_voronezh=row.get('Количество на складе «Воронеж»', ''),
-                    stock_korolev=row.get('Количество на складе «Королёв»', ''),
-                    stock_krasnodar=row.get('Количество на складе «Краснодар»', ''),
-                    stock_kazan=row.get('Количество на складе «Казань»', ''),
-                    stock_online=row.get('Количество на складе «Интернет-магазин»', ''),
-                    # Belarus prices
-                    price_byn_legal=price_byn_legal,
-                    price_byn_retail=price_byn_retail
-                )
-
-                # Add product to session
-                session.add(product)
-
-            # Save changes to database
-            await session.commit()
-            print("Импорт данных завершен успешно!")
-
-
-async def main():
+        batches = iter_converted_batches(file, batch_size, workers)
+
+        async with async_engine.begin() as conn:
+            # asyncpg connection of this transaction, used for COPY
+            raw_connection = await conn.get_raw_connection()
+            driver_connection = raw_connection.driver_connection
+
+            if upsert:
+                await upsert_rows(conn, driver_connection, batches, result, started)
+            else:
+                await insert_rows(driver_connection, batches, result, started)
+
+            # Mark catalog as changed so API snapshots reload
+            if result.changed_ids:
+                await bump_catalog_version(conn)
+
+    print(
+        f"Импорт данных завершен успешно за {time.monotonic() - started:.1f} с! "
+        f"Добавлено: {len(result.inserted_ids)}, обновлено: {len(result.updated_ids)}, "
+        f"снято с продажи: {len(result.removed_ids)}, без изменений: {result.unchanged}, "
+        f"пропущено: {result.skipped}"
+    )
+    return result
+
+
+def print_progress(processed, started):
+    """Print import progress"""
+    elapsed = time.monotonic() - started
+    print(f"Обработано {processed} строк ({processed / elapsed:.0f} строк/с)")
+
+
+async def insert_rows(driver_connection, batches, result, started):
+    """Append all rows as new products"""
+    processed = 0
+    async for values_list in batches:
+        now = datetime.datetime.now()
+        ids = await allocate_product_ids(driver_connection, len(values_list))
+
+        records = []
+        for product_id, values in zip(ids, values_list):
+            values['id'] = product_id
+            values['created_date'] = values['updated_date'] = now
+            records.append(to_record(values, PRODUCT_COPY_COLUMNS))
+
+        await driver_connection.copy_records_to_table(
+            Product.__tablename__,
+            records=records,
+            columns=PRODUCT_COPY_COLUMNS
+        )
+        await copy_stock(driver_connection, values_list)
+
+        result.inserted_ids.extend(ids)
+        processed += len(values_list)
+        print_progress(processed, started)
+
+
+async def upsert_rows(conn, driver_connection, batches, result, started):
+    """Insert new, update changed and remove missing products keyed by vendor_code"""
+    # Current state of the catalog: vendor_code -> (id, row_hash, removed_date)
+    existing = {}
+    duplicate_ids = []
+    rows = await conn.execute(
+        select(Product.id, Product.vendor_code, Product.row_hash, Product.removed_date)
+        .order_by(Product.id)
+    )
+    for row in rows:
+        if row.vendor_code in existing:
+            # Leftovers of earlier non-idempotent imports, the oldest row wins
+            if row.removed_date is None:
+                duplicate_ids.append(row.id)
+            continue
+        existing[row.vendor_code] = row
+
+    # Staging table for changed rows, applied with one UPDATE per batch
+    update_columns = [column for column in PRODUCT_COPY_COLUMNS if column not in ('id', 'created_date')]
+    await driver_connection.execute(
+        "CREATE TEMP TABLE products_upsert (LIKE products) ON COMMIT DROP")
+    assignments = ", ".join(f"{column} = u.{column}" for column in update_columns)
+    update_sql = (
+        f"UPDATE products AS p SET {assignments}, removed_date = NULL "
+        f"FROM products_upsert AS u WHERE p.id = u.id"
+    )
+
+    seen = set()
+    processed = 0
+    async for values_list in batches:
+        now = datetime.datetime.now()
+        new_values, changed_values = [], []
+
+        for values in values_list:
+            vendor_code = values['vendor_code']
+            if not vendor_code or vendor_code in seen:
+                # Without a unique key the row can't be matched on the next run
+                result.skipped += 1
+                continue
+            seen.add(vendor_code)
+
+            values['updated_date'] = now
+            current = existing.get(vendor_code)
+            if current is None:
+                values['created_date'] = now
+                new_values.append(values)
+            elif current.row_hash != values['row_hash'] or current.removed_date is not None:
+                values['id'] = current.id
+                values['created_date'] = None
+                changed_values.append(values)
+            else:
+                result.unchanged += 1
+
+        if new_values:
+            ids = await allocate_product_ids(driver_connection, len(new_values))
+            for product_id, values in zip(ids, new_values):
+                values['id'] = product_id
+            await driver_connection.copy_records_to_table(
+                Product.__tablename__,
+                records=[to_record(values, PRODUCT_COPY_COLUMNS) for values in new_values],
+                columns=PRODUCT_COPY_COLUMNS
+            )
+            await copy_stock(driver_connection, new_values)
+            result.inserted_ids.extend(ids)
+
+        if changed_values:
+            await driver_connection.execute("TRUNCATE products_upsert")
+            await driver_connection.copy_records_to_table(
+                'products_upsert',
+                records=[to_record(values, PRODUCT_COPY_COLUMNS) for values in changed_values],
+                columns=PRODUCT_COPY_COLUMNS
+            )
+            await driver_connection.execute(update_sql)
+
+            # Stock rows are replaced as a whole
+            await driver_connection.execute(
+                "DELETE FROM product_stock WHERE product_id = ANY($1::int[])",
+                [values['id'] for values in changed_values]
+            )
+            await copy_stock(driver_connection, changed_values)
+            result.updated_ids.extend(values['id'] for values in changed_values)
+
+        processed += len(values_list)
+        print_progress(processed, started)
+
+    # Products that disappeared from the feed
+    missing_ids = [
+        row.id for vendor_code, row in existing.items()
+        if vendor_code not in seen and row.removed_date is None
+    ]
+    removed_ids = missing_ids + duplicate_ids
+    if removed_ids:
+        now = datetime.datetime.now()
+        await driver_connection.execute(
+            "UPDATE products SET removed_date = $1, updated_date = $1 WHERE id = ANY($2::int[])",
+            now, removed_ids
+        )
+        result.removed_ids.extend(removed_ids)
+
+
+async def main(csv_path, batch_size, upsert, changed_ids_path, sync_search, workers):
     """Main entry point"""
     await create_tables()
-    csv_path = "full_database.csv"  # Path to CSV file
-    await process_csv(csv_path)
+    result = await process_csv(csv_path, batch_size=batch_size, upsert=upsert, workers=workers)
+
+    if changed_ids_path:
+        with open(changed_ids_path, 'w', encoding='utf-8') as file:
+            file.writelines(f"{product_id}\n" for product_id in result.changed_ids)
+        print(f"Измененные ID товаров записаны в {changed_ids_path}")
+
+    if sync_search and result.changed_ids:
+        # Delta sync picks up exactly the rows touched above (by updated_date)
+        meili = await get_meili_client()
+        try:
+            await meili.sync_products()
+        finally:
+            await close_meili_client()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Import products from CSV")
+    parser.add_argument("csv_path", nargs="?", default="full_database.csv", help="Path to CSV file")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Rows per COPY batch")
+    parser.add_argument("--upsert", action="store_true",
+                        help="Update products by vendor_code instead of appending")
+    parser.add_argument("--changed-ids", metavar="PATH", help="Write IDs of changed products to file")
+    parser.add_argument("--sync-search", action="store_true", help="Push changes to Meilisearch after import")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Processes converting rows (1 converts in the writer process)")
+    args = parser.parse_args()
+    asyncio.run(main(args.csv_path, args.batch_size, args.upsert, args.changed_ids, args.sync_search,
+                     args.workers))
@@ -0,0 +1,40 @@
+"""
+Database schema migration script
+
+Usage:
+    python -m mdm_bot.scripts.migrate           # create tables and apply pending migrations
+    python -m mdm_bot.scripts.migrate --status  # show applied and pending migrations
+"""
+import argparse
+import asyncio
+import logging
+from mdm_bot.core.database import async_engine, create_tables
+from mdm_bot.core.migrations import MIGRATIONS, get_applied_versions
+
+
+async def print_status():
+    """Print applied and pending migrations"""
+    async with async_engine.begin() as conn:
+        applied_versions = set(await get_applied_versions(conn))
+    for migration in MIGRATIONS:
+        mark = "✅" if migration.version in applied_versions else "⏳"
+        print(f"{mark} {migration.version:>4}  {migration.name}")
+
+
+async def main(status: bool):
+    """Main entry point"""
+    try:
+        if not status:
+            await create_tables()
+            print("Миграции применены!")
+        await print_status()
+    finally:
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Apply database schema migrations")
+    parser.add_argument("--status", action="store_true", help="Only show migration status")
+    args = parser.parse_args()
+    asyncio.run(main(args.status))
@@ -0,0 +1,29 @@
+"""
+Meilisearch synchronization script
+
+Usage:
+    python -m mdm_bot.scripts.sync_search         # push changes since last sync
+    python -m mdm_bot.scripts.sync_search --full  # push the whole catalog
+"""
+import argparse
+import asyncio
+import logging
+from mdm_bot.core.search import get_meili_client, close_meili_client
+
+
+async def main(full: bool):
+    """Main entry point"""
+    meili = await get_meili_client()
+    try:
+        await meili.sync_products(full=full)
+    finally:
+        await close_meili_client()
+    print("Синхронизация поиска завершена!")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Sync products to Meilisearch")
+    parser.add_argument("--full", action="store_true", help="Full resync instead of delta")
+    args = parser.parse_args()
+    asyncio.run(main(args.full))
@@ -4,9 +4,11 @@ Utility functions and helpers
 
 from .keyboards import get_main_keyboard
 from .formatters import format_product_card, format_price
+from .membership import membership_cache
 
 __all__ = [
     "get_main_keyboard",
     "format_product_card",
     "format_price",
+    "membership_cache",
 ]
@@ -1,6 +1,19 @@
 from sqlalchemy import select
 from mdm_bot.core import Product
 
+# Columns shown on the product card
+PRODUCT_CARD_COLUMNS = (
+    Product.id,
+    Product.name,
+    Product.vendor_code,
+    Product.price,
+    Product.vendor,
+    Product.availability,
+    Product.description,
+    Product.model,
+    Product.is_bestseller,
+)
+
 
 def format_price(price: float) -> str:
     """Format price for display"""
@@ -12,7 +25,7 @@ def format_product_card(product) -> str:
     Format product information as a card
 
     Args:
-        product: Product model instance
+        product: Product model instance or row with PRODUCT_CARD_COLUMNS
 
     Returns:
         Formatted product information as HTML string
@@ -77,10 +90,10 @@ async def update_product_card_message(callback, product_id: int, session):
     """
     from .keyboards import get_product_keyboard
 
-    # Get product information
-    stmt = select(Product).where(Product.id == product_id)
+    # Get product information (card columns only)
+    stmt = select(*PRODUCT_CARD_COLUMNS).where(Product.id == product_id)
     result = await session.execute(stmt)
-    product = result.scalar_one_or_none()
+    product = result.one_or_none()
 
     if product:
         product_info = format_product_card(product)
@@ -1,8 +1,8 @@
 from aiogram.types import InlineKeyboardMarkup, WebAppInfo
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from sqlalchemy import select
 
-from mdm_bot.core import Favorite, CartItem, settings
+from mdm_bot.core import settings
+from .membership import membership_cache
 
 
 def get_main_keyboard() -> InlineKeyboardMarkup:
@@ -73,15 +73,10 @@ async def get_product_keyboard(product_id: int, session, user_id: int) -> Inline
     """
     kb = InlineKeyboardBuilder()
 
-    # Check if product in favorites
-    fav_result = await session.execute(select(Favorite).where(
-        Favorite.user_id == user_id, Favorite.product_id == product_id))
-    is_fav = fav_result.scalar_one_or_none() is not None
-
-    # Check if product in cart
-    cart_result = await session.execute(select(CartItem).where(
-        CartItem.user_id == user_id, CartItem.product_id == product_id))
-    is_cart = cart_result.scalar_one_or_none() is not None
+    # Check if product in favorites and in cart (cached per user)
+    membership = await membership_cache.get(session, user_id)
+    is_fav = product_id in membership.favorites
+    is_cart = product_id in membership.cart
 
     # Cart button
     if is_cart:
@@ -0,0 +1,93 @@
+"""
+Per-user favorites/cart membership cache for product keyboards
+"""
+from dataclasses import dataclass, field
+from typing import Set
+from sqlalchemy import literal, select, union_all
+
+from mdm_bot.core import CartItem, Favorite, settings
+from mdm_bot.core.cache import TTLCache
+
+
+@dataclass
+class Membership:
+    """Product IDs a user has in favorites and in cart"""
+    favorites: Set[int] = field(default_factory=set)
+    cart: Set[int] = field(default_factory=set)
+
+
+class MembershipCache:
+    """
+    Favorites and cart product IDs per user, loaded with one query on miss.
+
+    Handlers that change favorites or cart must call the matching mutator
+    after commit so button state stays correct without a reload. Entries
+    expire after the TTL, which bounds staleness when several bot processes
+    serve the same user.
+    """
+
+    def __init__(self, max_users: int, ttl: float):
+        self._cache = TTLCache(max_entries=max_users, ttl=ttl)
+
+    async def get(self, session, user_id: int) -> Membership:
+        """Return user's membership, loading it from the database on miss"""
+        membership = self._cache.get(user_id)
+        if membership is None:
+            membership = await self._load(session, user_id)
+            self._cache.set(user_id, membership)
+        return membership
+
+    async def _load(self, session, user_id: int) -> Membership:
+        query = union_all(
+            select(literal("favorite").label("kind"), Favorite.product_id)
+            .where(Favorite.user_id == user_id),
+            select(literal("cart").label("kind"), CartItem.product_id)
+            .where(CartItem.user_id == user_id),
+        )
+        membership = Membership()
+        for kind, product_id in await session.execute(query):
+            (membership.favorites if kind == "favorite" else membership.cart).add(product_id)
+        return membership
+
+    def _cached(self, user_id: int):
+        # Only entries that are already cached are updated, missing ones load on next read.
+        # Peeked so write-through updates don't count in the hit/miss stats
+        return self._cache.peek(user_id)
+
+    def add_favorite(self, user_id: int, product_id: int):
+        """Record product added to favorites"""
+        membership = self._cached(user_id)
+        if membership is not None:
+            membership.favorites.add(product_id)
+
+    def remove_favorite(self, user_id: int, product_id: int):
+        """Record product removed from favorites"""
+        membership = self._cached(user_id)
+        if membership is not None:
+            membership.favorites.discard(product_id)
+
+    def add_to_cart(self, user_id: int, product_id: int):
+        """Record product added to cart"""
+        membership = self._cached(user_id)
+        if membership is not None:
+            membership.cart.add(product_id)
+
+    def remove_from_cart(self, user_id: int, product_id: int):
+        """Record product removed from cart"""
+        membership = self._cached(user_id)
+        if membership is not None:
+            membership.cart.discard(product_id)
+
+    def invalidate(self, user_id: int):
+        """Drop user's entry (e.g. after cart checkout or bulk changes)"""
+        self._cache.pop(user_id)
+
+    def stats(self) -> dict:
+        """Cache statistics for monitoring"""
+        return self._cache.stats()
+
+
+membership_cache = MembershipCache(
+    max_users=settings.MEMBERSHIP_CACHE_MAX_USERS,
+    ttl=settings.MEMBERSHIP_CACHE_TTL,
+)
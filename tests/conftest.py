@@ -0,0 +1,17 @@
+"""
+Shared test setup
+
+Settings require connection parameters; tests never connect, so dummy values
+are enough when no .env is present.
+"""
+import os
+
+for name, value in {
+    "BOT_TOKEN": "123456:test",
+    "POSTGRES_USER": "test",
+    "POSTGRES_PASSWORD": "test",
+    "POSTGRES_HOST": "localhost",
+    "POSTGRES_PORT": "5432",
+    "POSTGRES_DB": "test",
+}.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,36 @@
+"""
+Keyset pagination cursors of /api/products
+"""
+import base64
+
+import pytest
+from fastapi import HTTPException
+
+from mdm_bot.api.app import MAX_PRODUCT_ID, decode_cursor, encode_cursor
+
+
+def forge(value: str) -> str:
+    return base64.urlsafe_b64encode(value.encode()).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("product_id", [0, 1, 12345, MAX_PRODUCT_ID])
+def test_cursor_round_trip(product_id):
+    cursor = encode_cursor(product_id)
+
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == product_id
+
+
+@pytest.mark.parametrize("cursor", [
+    "!!!",
+    forge("abc"),
+    forge("-1"),
+    forge(str(MAX_PRODUCT_ID + 1)),
+    forge("99999999999999999999"),
+    base64.urlsafe_b64encode(b"\xff\xfe").decode(),
+])
+def test_invalid_cursor_is_rejected_with_400(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+
+    assert error.value.status_code == 400
@@ -0,0 +1,82 @@
+"""
+Product list filters: Meilisearch expressions and query parameter validation
+"""
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from mdm_bot.api.filters import ProductFilters, product_filters
+
+
+@pytest.fixture
+def client() -> TestClient:
+    app = FastAPI()
+
+    @app.get("/filters")
+    def echo(filters: ProductFilters = Depends(product_filters)):
+        return {"filter": filters.meili_filter(), "sort": filters.meili_sort()}
+
+    return TestClient(app)
+
+
+def test_empty_filters():
+    filters = ProductFilters()
+
+    assert filters.is_empty
+    assert filters.meili_filter() == []
+    assert filters.meili_sort() == []
+    assert not ProductFilters(sort="price_asc").is_filtered
+
+
+def test_vendor_values_are_quoted_and_escaped():
+    filters = ProductFilters(vendors=('A "B"', "C\\D"))
+
+    assert filters.meili_filter() == ['vendor IN ["A \\"B\\"", "C\\\\D"]']
+
+
+@pytest.mark.parametrize("price, expected", [
+    (100.0, "100.0"),
+    (0.00001, "0.00001"),
+    (99.99, "99.99"),
+    (1e20, "100000000000000000000"),
+])
+def test_prices_are_written_without_exponent(price, expected):
+    filters = ProductFilters(price_min=price, price_max=price)
+
+    assert filters.meili_filter() == [f"price >= {expected}", f"price <= {expected}"]
+
+
+def test_warehouse_and_stock_conditions():
+    assert ProductFilters(in_stock=True).meili_filter() == ["in_stock = true"]
+    assert ProductFilters(bestseller=False).meili_filter() == ["is_bestseller = false"]
+    assert ProductFilters(warehouse="spb").meili_filter() == ['warehouses = "spb"']
+    assert ProductFilters(warehouse="spb", in_stock=False).meili_filter() == ['NOT warehouses = "spb"']
+
+
+def test_sort_breaks_ties_by_id():
+    assert ProductFilters(sort="price_desc").meili_sort() == ["price:desc", "id:asc"]
+
+
+def test_query_parameters_are_normalized(client):
+    response = client.get("/filters", params={"vendor": ["b", " a ", "b", ""], "price_min": "1e-05"})
+
+    assert response.status_code == 200
+    assert response.json()["filter"] == ['vendor IN ["a", "b"]', "price >= 0.00001"]
+
+
+@pytest.mark.parametrize("params", [
+    {"price_min": "inf"},
+    {"price_max": "nan"},
+    {"price_min": "-1"},
+])
+def test_non_finite_and_negative_prices_are_rejected(client, params):
+    assert client.get("/filters", params=params).status_code == 422
+
+
+@pytest.mark.parametrize("params", [
+    {"price_min": "10", "price_max": "5"},
+    {"warehouse": "nowhere"},
+    {"sort": "name"},
+])
+def test_inconsistent_filters_are_rejected(client, params):
+    assert client.get("/filters", params=params).status_code == 400
@@ -0,0 +1,94 @@
+"""
+Conditional caching of catalog responses: ETags and 304 answers
+"""
+import pytest
+from fastapi import FastAPI, Request, Response
+from fastapi.testclient import TestClient
+
+from mdm_bot.api import http_cache
+from mdm_bot.api.http_cache import catalog_etag, etag_matches, not_modified, uncacheable
+
+
+@pytest.fixture
+def versions(monkeypatch):
+    versions = {"catalog": "v1", "search": "s1"}
+
+    async def current_catalog_version():
+        return versions["catalog"]
+
+    async def current_search_version():
+        return versions["search"]
+
+    monkeypatch.setattr(http_cache, "current_catalog_version", current_catalog_version)
+    monkeypatch.setattr(http_cache, "current_search_version", current_search_version)
+    return versions
+
+
+@pytest.fixture
+def client(versions) -> TestClient:
+    app = FastAPI()
+
+    @app.get("/products")
+    async def products(request: Request, response: Response):
+        cached = await not_modified(request, response)
+        return cached or {"items": []}
+
+    @app.get("/search")
+    async def search(request: Request, response: Response, degraded: bool = False):
+        cached = await not_modified(request, response, search=True)
+        if cached is not None:
+            return cached
+        if degraded:
+            uncacheable(response)
+        return {"items": []}
+
+    return TestClient(app)
+
+
+def test_catalog_etag():
+    assert catalog_etag(None, "s1") is None
+    assert catalog_etag("v1") == f'W/"v1-{http_cache.ETAG_REVISION}"'
+    assert catalog_etag("v1", "s1") != catalog_etag("v1", "s2")
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, False),
+    ('W/"v1-2"', True),
+    ('"v1-2"', True),
+    ('"v0-2", W/"v1-2"', True),
+    ("*", True),
+    ('W/"v0-2"', False),
+])
+def test_etag_matches_with_weak_comparison(header, expected):
+    assert etag_matches(header, 'W/"v1-2"') is expected
+
+
+def test_current_etag_gets_304(client):
+    etag = client.get("/products").headers["ETag"]
+
+    response = client.get("/products", headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+
+
+def test_catalog_update_changes_etag(client, versions):
+    etag = client.get("/products").headers["ETag"]
+    versions["catalog"] = "v2"
+
+    assert client.get("/products", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_search_etag_follows_index_sync(client, versions):
+    etag = client.get("/search").headers["ETag"]
+    versions["search"] = "s2"
+
+    assert client.get("/products").headers["ETag"] == catalog_etag("v1")
+    assert client.get("/search", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_degraded_answer_is_not_cached(client):
+    response = client.get("/search", params={"degraded": True})
+
+    assert "ETag" not in response.headers
+    assert response.headers["Cache-Control"] == "no-store"
@@ -0,0 +1,99 @@
+"""
+Thumbnail generation, the on-disk LRU cache and resize pool sizing
+"""
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from mdm_bot.api import images
+from mdm_bot.api.images import DiskLRUCache, image_revision, image_worker_count, make_thumbnails, thumbnail_name
+
+
+def make_cache(tmp_path, max_bytes=250) -> DiskLRUCache:
+    cache = DiskLRUCache(str(tmp_path), max_bytes)
+    cache.load()
+    return cache
+
+
+def test_disk_cache_round_trip(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.set("ab1", b"x" * 10)
+
+    assert cache.get("ab1") == b"x" * 10
+    assert cache.get("ab2") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+    assert not [path for path in tmp_path.rglob(".tmp-*")]
+
+
+def test_disk_cache_evicts_least_recently_used(tmp_path):
+    cache = make_cache(tmp_path)
+    for name in ("ab1", "ab2"):
+        cache.set(name, b"x" * 100)
+    cache.get("ab1")
+    cache.set("ab3", b"x" * 100)
+
+    assert cache.get("ab2") is None
+    assert not (tmp_path / "ab" / "ab2").exists()
+    assert cache.get("ab1") is not None
+    assert cache.stats()["bytes"] == 200
+    assert cache.stats()["evictions"] == 1
+
+
+def test_disk_cache_restores_recency_from_mtimes(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=1000)
+    for age, name in enumerate(("ab1", "ab2", "ab3")):
+        cache.set(name, b"x" * 100)
+        os.utime(tmp_path / "ab" / name, (1000 + age, 1000 + age))
+
+    restarted = make_cache(tmp_path, max_bytes=250)
+
+    assert sorted(path.name for path in (tmp_path / "ab").iterdir()) == ["ab2", "ab3"]
+    assert restarted.stats()["entries"] == 2
+
+
+def test_disk_cache_treats_file_removed_by_another_worker_as_miss(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.set("ab1", b"x" * 100)
+    (tmp_path / "ab" / "ab1").unlink()
+
+    assert cache.get("ab1") is None
+    assert cache.stats()["bytes"] == 0
+
+
+def test_make_thumbnails_fits_each_size_without_upscaling():
+    source = io.BytesIO()
+    Image.new("RGB", (1200, 600), "red").save(source, "JPEG")
+
+    thumbnails = make_thumbnails(source.getvalue(), {"tile": 320, "huge": 4000})
+
+    assert Image.open(io.BytesIO(thumbnails["tile"])).size == (320, 160)
+    assert Image.open(io.BytesIO(thumbnails["huge"])).size == (1200, 600)
+    assert Image.open(io.BytesIO(thumbnails["tile"])).format == "WEBP"
+
+
+def test_make_thumbnails_rejects_non_images():
+    with pytest.raises(images.ImageUnavailable):
+        make_thumbnails(b"<html>", {"tile": 320})
+
+
+def test_revision_and_names_depend_on_image_url():
+    assert image_revision("http://a/1.jpg") != image_revision("http://a/2.jpg")
+    assert thumbnail_name("http://a/1.jpg", "tile") != thumbnail_name("http://a/1.jpg", "detail")
+
+
+def test_worker_count_is_capped_by_cpus_and_memory(monkeypatch):
+    monkeypatch.setattr(images.settings, "IMAGE_WORKERS", 8)
+    monkeypatch.setattr(images.settings, "IMAGE_WORKER_MEMORY_BYTES", 256 * 1024 * 1024)
+    monkeypatch.setattr(images, "available_cpus", lambda: 4)
+
+    monkeypatch.setattr(images, "memory_limit", lambda: None)
+    assert image_worker_count() == 4
+
+    monkeypatch.setattr(images, "memory_limit", lambda: 512 * 1024 * 1024)
+    assert image_worker_count() == 2
+
+    monkeypatch.setattr(images, "memory_limit", lambda: 100 * 1024 * 1024)
+    assert image_worker_count() == 1
@@ -0,0 +1,58 @@
+"""
+Rendered product fragments and their cache keys
+"""
+import asyncio
+import datetime
+
+import pytest
+
+from mdm_bot.api import pages
+from mdm_bot.api.pages import fragment_cache, render_product_fragment
+from mdm_bot.api.schemas import ProductResponse
+
+
+@pytest.fixture
+def products(monkeypatch):
+    products = {}
+    renders = []
+
+    async def read_product(product_id):
+        return products.get(product_id)
+
+    render = pages.templates.get_template("partials/product_detail.html").render
+
+    def counting_render(**context):
+        renders.append(context["product"].id)
+        return render(**context)
+
+    monkeypatch.setattr(pages, "read_product", read_product)
+    monkeypatch.setattr(pages.templates.get_template("partials/product_detail.html"), "render", counting_render)
+    fragment_cache.clear()
+    yield products, renders
+    fragment_cache.clear()
+
+
+def product(name: str, updated: int) -> ProductResponse:
+    return ProductResponse(
+        id=1, name=name, price=100.0, updated_date=datetime.datetime(2026, 1, 1, 0, 0, updated))
+
+
+def test_fragment_is_reused_until_the_product_changes(products):
+    products, renders = products
+    products[1] = product("Кабель", updated=0)
+
+    first = asyncio.run(render_product_fragment(1))
+    assert asyncio.run(render_product_fragment(1)) == first
+    assert renders == [1]
+
+    products[1] = product("Кабель HDMI", updated=1)
+    assert "Кабель HDMI" in asyncio.run(render_product_fragment(1))
+    assert renders == [1, 1]
+
+
+def test_missing_product_has_no_fragment(products):
+    assert asyncio.run(render_product_fragment(2)) is None
+
+
+def test_revision_is_not_part_of_the_json():
+    assert "updated_date" not in product("Кабель", updated=0).model_dump()
@@ -0,0 +1,121 @@
+"""
+User registration write-behind: batching and re-queueing of failed writes
+"""
+import asyncio
+from typing import List, Optional
+
+import pytest
+
+from mdm_bot.core import users
+from mdm_bot.core.users import UserWriteBehind
+
+
+class FakeSession:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def commit(self):
+        pass
+
+
+class Upserts:
+    """Stand-in for upsert_users recording written batches"""
+
+    def __init__(self):
+        self.batches: List[List[int]] = []
+        self.error: Optional[Exception] = None
+        self.started = asyncio.Event()
+        self.release: Optional[asyncio.Event] = None
+
+    async def __call__(self, session, batch):
+        batch = [user["telegram_id"] for user in batch]
+        self.started.set()
+        if self.release is not None:
+            await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        self.batches.append(batch)
+
+
+@pytest.fixture
+def upserts(monkeypatch):
+    upserts = Upserts()
+    monkeypatch.setattr(users, "AsyncSessionFactory", FakeSession)
+    monkeypatch.setattr(users, "upsert_users", upserts)
+    return upserts
+
+
+def enqueue(queue: UserWriteBehind, *telegram_ids: int):
+    for telegram_id in telegram_ids:
+        queue.enqueue(telegram_id, f"user{telegram_id}", "Имя")
+
+
+def test_flush_writes_pending_users_in_batches(upserts):
+    queue = UserWriteBehind(flush_interval=60, batch_size=2)
+    enqueue(queue, 1, 2, 3, 1)
+
+    asyncio.run(queue.flush())
+
+    assert upserts.batches == [[1, 2], [3]]
+    assert queue._pending == {}
+
+
+def test_failed_batch_is_put_back_without_overwriting_newer_data(upserts):
+    queue = UserWriteBehind(flush_interval=60, batch_size=10)
+    enqueue(queue, 1, 2)
+    upserts.error = RuntimeError("database is down")
+
+    async def flush_while_user_changes_name():
+        upserts.release = asyncio.Event()
+        flush = asyncio.create_task(queue.flush())
+        await upserts.started.wait()
+        queue.enqueue(1, "renamed", "Имя")
+        upserts.release.set()
+        await flush
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(flush_while_user_changes_name())
+
+    assert sorted(queue._pending) == [1, 2]
+    assert queue._pending[1]["username"] == "renamed"
+
+
+def test_cancelled_flush_puts_batch_back(upserts):
+    queue = UserWriteBehind(flush_interval=60, batch_size=10)
+    enqueue(queue, 1, 2)
+
+    async def cancel_mid_upsert():
+        upserts.release = asyncio.Event()
+        flush = asyncio.create_task(queue.flush())
+        await upserts.started.wait()
+        flush.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await flush
+
+    asyncio.run(cancel_mid_upsert())
+
+    assert sorted(queue._pending) == [1, 2]
+    assert upserts.batches == []
+
+
+def test_stop_lets_running_flush_finish_and_writes_the_rest(upserts):
+    queue = UserWriteBehind(flush_interval=60, batch_size=2)
+
+    async def stop_during_flush():
+        upserts.release = asyncio.Event()
+        queue.start()
+        enqueue(queue, 1, 2)
+        await upserts.started.wait()
+        enqueue(queue, 3)
+        stop = asyncio.create_task(queue.stop())
+        await asyncio.sleep(0)
+        upserts.release.set()
+        await stop
+
+    asyncio.run(stop_during_flush())
+
+    assert upserts.batches == [[1, 2], [3]]
+    assert queue._pending == {}